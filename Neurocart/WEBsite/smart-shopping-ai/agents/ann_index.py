@@ -0,0 +1,238 @@
+import os
+import time
+import argparse
+import logging
+from pathlib import Path
+import numpy as np
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index over product embeddings.
+
+    A spherical k-means coarse quantizer splits the unit-normalised vectors into
+    `n_lists` cells; a query is scored exactly against the vectors of its `nprobe`
+    closest cells only. Scores are inner products of unit vectors (cosine similarity).
+    Products can be inserted, updated and deleted without retraining.
+    """
+
+    def __init__(self, dim, n_lists=64, nprobe=8):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.centroids = None
+        self.trained_size = 0
+
+        # Slot storage: row i of `vectors` belongs to ids[i] and lives in cell assign[i] (-1 = free)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.assign = np.empty(0, dtype=np.int32)
+        self.ids = []
+        self.slots = {}
+        self.free_slots = []
+        self.lists = {}
+        self._list_arrays = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, product_id):
+        return product_id in self.slots
+
+    def train(self, matrix, n_iter=20, seed=42, sample_size=None):
+        """Fit the coarse quantizer with spherical k-means on (a sample of) the matrix."""
+        data = _normalize(matrix)
+        rng = np.random.default_rng(seed)
+        sample_size = sample_size or 256 * self.n_lists
+        if len(data) > sample_size:
+            data = data[rng.choice(len(data), sample_size, replace=False)]
+
+        self.n_lists = max(1, min(self.n_lists, len(data)))
+        centroids = data[rng.choice(len(data), self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=self.n_lists)
+            empty = counts == 0
+            # Re-seed empty cells with random points so every list stays useful
+            if empty.any():
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.trained_size = len(matrix)
+        self.lists = {cell: [] for cell in range(self.n_lists)}
+        self._list_arrays = {}
+
+    def add(self, ids, matrix):
+        """Insert products, replacing the vectors of IDs that are already indexed."""
+        if self.centroids is None:
+            raise RuntimeError("IVFIndex must be trained before vectors are added")
+        ids = list(ids)
+        if not ids:
+            return
+        self.delete([product_id for product_id in ids if product_id in self.slots])
+
+        data = _normalize(matrix)
+        cells = np.argmax(data @ self.centroids.T, axis=1).astype(np.int32)
+
+        needed = len(ids) - len(self.free_slots)
+        if needed > 0:
+            start = len(self.ids)
+            self.vectors = np.concatenate([self.vectors, np.empty((needed, self.dim), dtype=np.float32)])
+            self.assign = np.concatenate([self.assign, np.full(needed, -1, dtype=np.int32)])
+            self.ids.extend([None] * needed)
+            self.free_slots.extend(range(start, start + needed))
+
+        for product_id, vector, cell in zip(ids, data, cells):
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector
+            self.assign[slot] = cell
+            self.ids[slot] = product_id
+            self.slots[product_id] = slot
+            self.lists[int(cell)].append(slot)
+            self._list_arrays.pop(int(cell), None)
+
+    def delete(self, ids):
+        """Remove products from the index; unknown IDs are ignored."""
+        touched = set()
+        for product_id in ids:
+            slot = self.slots.pop(product_id, None)
+            if slot is None:
+                continue
+            cell = int(self.assign[slot])
+            self.lists[cell].remove(slot)
+            touched.add(cell)
+            self.assign[slot] = -1
+            self.ids[slot] = None
+            self.free_slots.append(slot)
+        for cell in touched:
+            self._list_arrays.pop(cell, None)
+
+    def _cell_slots(self, cell):
+        slots = self._list_arrays.get(cell)
+        if slots is None:
+            slots = np.array(self.lists[cell], dtype=np.int64)
+            self._list_arrays[cell] = slots
+        return slots
+
+    def search(self, query, k=10, nprobe=None, exclude=()):
+        """Return [(product_id, cosine similarity)] for approximately the k nearest products."""
+        if not self.slots:
+            return []
+        query = _normalize(query)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        cells = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        candidates = np.concatenate([self._cell_slots(int(cell)) for cell in cells])
+        if exclude:
+            excluded = [self.slots[p] for p in exclude if p in self.slots]
+            candidates = candidates[~np.isin(candidates, excluded)]
+        if len(candidates) == 0:
+            return []
+
+        scores = self.vectors[candidates] @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def save(self, path):
+        path = Path(path)
+        os.makedirs(path.parent, exist_ok=True)
+        live = np.flatnonzero(self.assign >= 0)
+        tmp_path = path.with_name(path.stem + '.tmp.npz')
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            vectors=self.vectors[live],
+            assign=self.assign[live],
+            ids=np.array([self.ids[i] for i in live], dtype=str),
+            params=np.array([self.dim, self.n_lists, self.nprobe, self.trained_size], dtype=np.int64)
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved ANN index with {len(self)} vectors in {self.n_lists} lists to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as archive:
+            dim, n_lists, nprobe, trained_size = (int(v) for v in archive['params'])
+            index = cls(dim, n_lists, nprobe)
+            index.centroids = archive['centroids']
+            index.trained_size = trained_size
+            index.vectors = archive['vectors'].astype(np.float32)
+            index.assign = archive['assign'].astype(np.int32)
+            index.ids = archive['ids'].tolist()
+        index.slots = {product_id: slot for slot, product_id in enumerate(index.ids)}
+        index.lists = {cell: [] for cell in range(index.n_lists)}
+        for slot, cell in enumerate(index.assign):
+            index.lists[int(cell)].append(slot)
+        return index
+
+    @classmethod
+    def build(cls, ids, matrix, n_lists=None, nprobe=8):
+        """Train and fill an index; by default uses about 4 * sqrt(n) lists."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+        index = cls(matrix.shape[1], n_lists, nprobe)
+        index.train(matrix)
+        index.add(ids, matrix)
+        return index
+
+    def needs_retrain(self, growth=4.0):
+        """True once the index holds far more vectors than the quantizer was trained on."""
+        return len(self) > growth * max(self.trained_size, 1)
+
+def benchmark(n=100000, dim=128, n_queries=200, k=10, n_clusters=500, seed=0):
+    """Print recall@k and latency versus nprobe against exact brute-force search."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = matrix[rng.choice(n, n_queries, replace=False)] + 0.1 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    ids = [f"P{i}" for i in range(n)]
+
+    start = time.perf_counter()
+    index = IVFIndex.build(ids, matrix)
+    print(f"Built IVF index over {n} x {dim} vectors with {index.n_lists} lists in {time.perf_counter() - start:.2f}s")
+
+    unit = _normalize(matrix)
+    start = time.perf_counter()
+    exact = [set(np.argpartition(-(unit @ q), k)[:k].tolist()) for q in _normalize(queries)]
+    brute_ms = 1000 * (time.perf_counter() - start) / n_queries
+    print(f"{'brute force':>12}: recall@{k}=1.000  {brute_ms:8.3f} ms/query")
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.n_lists:
+            break
+        start = time.perf_counter()
+        results = [index.search(q, k, nprobe=nprobe) for q in queries]
+        ms = 1000 * (time.perf_counter() - start) / n_queries
+        recall = np.mean([len({int(pid[1:]) for pid, _ in res} & truth) / k
+                          for res, truth in zip(results, exact)])
+        print(f"{'nprobe=' + str(nprobe):>12}: recall@{k}={recall:.3f}  {ms:8.3f} ms/query")
+
+def main():
+    parser = argparse.ArgumentParser(description='IVF approximate nearest-neighbour index for product embeddings')
+    parser.add_argument('--benchmark', action='store_true', help='Run the recall-vs-latency benchmark')
+    parser.add_argument('--n', type=int, default=100000, help='Synthetic vectors for the benchmark')
+    parser.add_argument('--dim', type=int, default=128, help='Dimensionality for the benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(n=args.n, dim=args.dim)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import argparse
+import logging
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PARQUET_EXTENSIONS = {'.parquet', '.pq'}
+ARROW_EXTENSIONS = {'.arrow', '.feather', '.ipc'}
+COLUMNAR_EXTENSIONS = PARQUET_EXTENSIONS | ARROW_EXTENSIONS
+
+# Rows per record batch when reading Parquet (Arrow IPC files keep the batches they were written with)
+DEFAULT_BATCH_SIZE = 50000
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("Reading Parquet/Arrow files requires pyarrow (pip install pyarrow)") from e
+
+def is_columnar(file_path):
+    return Path(file_path).suffix.lower() in COLUMNAR_EXTENSIONS
+
+def _open_ipc(pa, file_path):
+    """Arrow IPC comes in a random-access file format (.arrow/.feather) and a stream format."""
+    try:
+        return pa.ipc.open_file(pa.memory_map(str(file_path), 'r'))
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.memory_map(str(file_path), 'r'))
+
+def count_rows(file_path):
+    """Number of rows in a Parquet or Arrow IPC file, read from metadata where possible."""
+    pa = _pyarrow()
+    if Path(file_path).suffix.lower() in PARQUET_EXTENSIONS:
+        return pa.parquet.ParquetFile(str(file_path)).metadata.num_rows
+    reader = _open_ipc(pa, file_path)
+    if isinstance(reader, pa.ipc.RecordBatchFileReader):
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return sum(batch.num_rows for batch in reader)
+
+def read_schema(file_path):
+    """Arrow schema of a Parquet or Arrow IPC file, without its (row-count dependent) metadata."""
+    pa = _pyarrow()
+    if Path(file_path).suffix.lower() in PARQUET_EXTENSIONS:
+        schema = pa.parquet.ParquetFile(str(file_path)).schema_arrow
+    else:
+        schema = _open_ipc(pa, file_path).schema
+    return schema.remove_metadata()
+
+def fingerprint_rows(file_path, n_rows):
+    """
+    sha256 of a Parquet or Arrow IPC file's schema and its first `n_rows` rows.
+
+    Unlike the file's bytes, this stays the same when the file is rewritten with rows
+    appended, however the rows are split into row groups or record batches.
+    """
+    digest = hashlib.sha256(str(read_schema(file_path)).encode('utf-8'))
+    remaining = n_rows
+    for batch in iter_record_batches(file_path, batch_size=max(1, n_rows)):
+        if remaining <= 0:
+            break
+        for row in batch.slice(0, remaining).to_pylist():
+            digest.update(json.dumps(row, default=str, sort_keys=True).encode('utf-8') + b'\n')
+        remaining -= min(remaining, batch.num_rows)
+    return digest.hexdigest()
+
+def iter_record_batches(file_path, batch_size=DEFAULT_BATCH_SIZE, skip_rows=0):
+    """
+    Yield pyarrow RecordBatches from a Parquet or Arrow IPC file without loading it whole.
+
+    Args:
+        file_path (str): Path to a .parquet/.pq or .arrow/.feather/.ipc file
+        batch_size (int): Rows per batch for Parquet files
+        skip_rows (int): Leading rows to skip, e.g. ones already loaded
+    """
+    pa = _pyarrow()
+    if Path(file_path).suffix.lower() in PARQUET_EXTENSIONS:
+        batches = pa.parquet.ParquetFile(str(file_path)).iter_batches(batch_size=batch_size)
+    else:
+        reader = _open_ipc(pa, file_path)
+        if isinstance(reader, pa.ipc.RecordBatchFileReader):
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            batches = iter(reader)
+
+    for batch in batches:
+        if skip_rows >= batch.num_rows:
+            skip_rows -= batch.num_rows
+            continue
+        if skip_rows:
+            batch = batch.slice(skip_rows)
+            skip_rows = 0
+        yield batch
+
+def _coerce_array(pa, array, declared):
+    """Cast one Arrow column to what a SQLite column of the declared type should receive."""
+    declared = (declared or '').upper()
+    if pa.types.is_list(array.type) or pa.types.is_large_list(array.type) or pa.types.is_struct(array.type):
+        # Nested values (e.g. interests) are stored as JSON text, like the CSV exports
+        return pa.array([None if value is None else json.dumps(value) for value in array.to_pylist()],
+                        type=pa.string())
+    if 'INT' in declared:
+        # Unsafe cast truncates fractional values, as int() did for CSV rows
+        return pa.compute.cast(array, pa.int64(), safe=False)
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.compute.cast(array, pa.float64())
+    if 'DATE' in declared or 'TIME' in declared:
+        # Stored as 'YYYY-MM-DD[ HH:MM:SS]' text like the rest of the database; casting is far
+        # faster than strftime and drops sub-second precision
+        if pa.types.is_timestamp(array.type):
+            target = pa.date32() if declared == 'DATE' else pa.timestamp('s', array.type.tz)
+            return pa.compute.cast(pa.compute.cast(array, target, safe=False), pa.string())
+        if pa.types.is_date(array.type):
+            return pa.compute.cast(array, pa.string())
+        return array
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return array if pa.types.is_string(array.type) else pa.compute.cast(array, pa.string())
+    return array
+
+def coerce_batch(batch, column_types=None):
+    """
+    Convert a RecordBatch to a DataFrame, casting each column to its target SQLite type.
+
+    Columns are matched to `column_types` case-insensitively; unmatched columns are
+    converted as they are.
+
+    Args:
+        batch (pyarrow.RecordBatch): Batch read from a columnar file
+        column_types (dict): Lower-case column name -> declared SQLite type, e.g. 'INTEGER'
+    """
+    pa = _pyarrow()
+    column_types = column_types or {}
+    arrays = []
+    for name, array in zip(batch.schema.names, batch.columns):
+        try:
+            arrays.append(_coerce_array(pa, array, column_types.get(name.strip().lower())))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"Cannot convert column {name!r} to {column_types.get(name.lower())}: {e}") from e
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names).to_pandas()
+
+def read_frames(file_path, chunksize=DEFAULT_BATCH_SIZE, column_types=None, skip_rows=0):
+    """
+    Yield DataFrames of at most `chunksize` rows from a CSV, Parquet or Arrow IPC file.
+
+    Args:
+        file_path (str): Input file; the format is taken from the extension
+        chunksize (int): Rows per frame
+        column_types (dict): Lower-case column name -> declared SQLite type, applied to columnar input
+        skip_rows (int): Leading data rows to skip (columnar input only)
+    """
+    if not is_columnar(file_path):
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+        return
+    for batch in iter_record_batches(file_path, chunksize, skip_rows):
+        yield coerce_batch(batch, column_types)
+
+def read_frame(file_path, column_types=None):
+    """Read a whole CSV, Parquet or Arrow IPC file into one DataFrame."""
+    if not is_columnar(file_path):
+        return pd.read_csv(file_path)
+    frames = list(read_frames(file_path, column_types=column_types))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def table_column_types(cursor, table):
+    """Lower-case column name -> declared type for a SQLite table."""
+    return {row[1].lower(): row[2] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+def benchmark(n_rows=1000000, chunksize=DEFAULT_BATCH_SIZE, seed=0):
+    """Compare loading the same event log from CSV, Parquet and Arrow IPC into SQLite."""
+    pa = _pyarrow()
+    # Imported here because the loader itself imports this module
+    from agents.customer_loader import CustomerLoaderAgent
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'interaction_id': [f"I{i:09d}" for i in range(n_rows)],
+        'customer_id': [f"C{i:06d}" for i in rng.integers(0, 100000, n_rows)],
+        'product_id': [f"P{i:05d}" for i in rng.integers(0, 20000, n_rows)],
+        'event_type': rng.choice(['view', 'click', 'add_to_cart', 'purchase'], n_rows),
+        'timestamp': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 86400 * 90, n_rows), unit='s'),
+        'dwell_time': rng.integers(1, 600, n_rows),
+    })
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        paths = {'csv': tmp / 'events.csv', 'parquet': tmp / 'events.parquet', 'arrow': tmp / 'events.arrow'}
+        df.to_csv(paths['csv'], index=False)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pa.parquet.write_table(table, paths['parquet'])
+        with pa.ipc.new_file(str(paths['arrow']), table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunksize)
+        print(f"{n_rows} event rows: " + ", ".join(f"{name} {path.stat().st_size / 1e6:.1f} MB"
+                                                   for name, path in paths.items()))
+
+        for name, path in paths.items():
+            start = time.perf_counter()
+            rows = sum(len(frame) for frame in read_frames(path, chunksize, {'timestamp': 'DATETIME'}))
+            read_seconds = time.perf_counter() - start
+
+            db_path = tmp / f'{name}.db'
+            conn = sqlite3.connect(db_path)
+            conn.execute("""CREATE TABLE event_logs (interaction_id TEXT PRIMARY KEY, customer_id TEXT,
+                            product_id TEXT, event_type TEXT, timestamp DATETIME, dwell_time INTEGER)""")
+            conn.close()
+            loader = CustomerLoaderAgent(path, chunksize=chunksize)
+            loader.db_path = db_path
+            loader.connect_db()
+            logging.getLogger('agents.customer_loader').setLevel(logging.WARNING)
+            start = time.perf_counter()
+            loader.load_table(path, 'event_logs')
+            load_seconds = time.perf_counter() - start
+            loader.conn.close()
+            print(f"{name:>8}: read {read_seconds:6.2f}s ({rows / read_seconds:9.0f} rows/sec), "
+                  f"load into SQLite {load_seconds:6.2f}s ({rows / load_seconds:9.0f} rows/sec)")
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV / Parquet / Arrow IPC input helpers')
+    parser.add_argument('--benchmark', action='store_true', help='Compare CSV and columnar load times')
+    parser.add_argument('--rows', type=int, default=1000000, help='Synthetic event rows for the benchmark')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per batch')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.rows, args.chunksize)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
+import io
 import os
 import sqlite3
+import time
+import hashlib
+import itertools
 import pandas as pd
 import argparse
 from pathlib import Path
 import logging
+import sys
 from datetime import datetime
 
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+from agents.columnar import read_frames, is_columnar, count_rows, fingerprint_rows, table_column_types
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,18 +21,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows read from the CSV and written with executemany per transaction
+DEFAULT_CHUNKSIZE = 50000
+
+EVENT_LOG_FILES = ['event_logs.parquet', 'event_logs.arrow', 'event_logs.csv']
+
+# Leading bytes (CSV) or rows (Parquet/Arrow) hashed to recognise a source file that has been
+# replaced rather than appended to
+FINGERPRINT_BYTES = 4096
+FINGERPRINT_ROWS = 1000
+
+WATERMARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+        source TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        fingerprint_bytes INTEGER NOT NULL,
+        byte_offset INTEGER NOT NULL,
+        rows_loaded INTEGER NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
 class CustomerLoaderAgent:
-    def __init__(self, input_file):
+    def __init__(self, input_file, chunksize=DEFAULT_CHUNKSIZE, upsert=False, incremental=True):
         # Get the absolute path to the project root
         self.project_root = Path(__file__).parent.parent.absolute()
-        
+
         # Set up paths relative to project root
         self.db_path = self.project_root / 'database' / 'data.db'
         self.input_file = Path(input_file)
-        
+        self.chunksize = chunksize
+        self.upsert = upsert
+        self.incremental = incremental
+
         # Ensure database directory exists
         os.makedirs(self.project_root / 'database', exist_ok=True)
-        
+
         self.conn = None
         self.cursor = None
 
@@ -38,51 +70,305 @@ class CustomerLoaderAgent:
             logger.error(f"Failed to connect to database: {e}")
             raise
 
+    def _insert_statement(self, table, columns, upsert=False):
+        """
+        Build the INSERT for a chunk, as an upsert on the table's primary key when requested.
+
+        Args:
+            table (str): Target table
+            columns (list): Columns being written
+            upsert (bool): Update rows whose key already exists instead of failing
+        """
+        placeholders = ', '.join('?' * len(columns))
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        if not upsert:
+            return statement
+
+        info = self.cursor.execute(f"PRAGMA table_info({table})").fetchall()
+        key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5] > 0]
+        if not key or not set(key) <= set(columns):
+            logger.warning(f"Cannot upsert into {table} without its key {key}; inserting instead")
+            return statement
+        updates = [f"{column} = excluded.{column}" for column in columns if column not in key]
+        action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        return f"{statement} ON CONFLICT ({', '.join(key)}) {action}"
+
+    def _write_frames(self, table, frames, defaults=None, upsert=None):
+        """
+        Write DataFrames to a table, one transaction per frame.
+
+        CSV headers are matched to table columns case-insensitively; columns the table
+        does not have are skipped, and `defaults` fill table columns the file lacks.
+
+        Args:
+            table (str): Target table
+            frames (iterable): (DataFrame, extra) pairs, where extra is a list of
+                (sql, params) statements committed in the same transaction as the frame
+            defaults (dict): Values for columns missing from the file
+            upsert (bool): Upsert on the table's key; None uses the agent's `upsert` setting
+
+        Returns:
+            int: Number of rows written
+        """
+        upsert = self.upsert if upsert is None else upsert
+        table_columns = [row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if not table_columns:
+            raise ValueError(f"Table {table} does not exist in {self.db_path}")
+        defaults = {column: value for column, value in (defaults or {}).items() if column in table_columns}
+
+        rows = 0
+        start = time.perf_counter()
+        statement = None
+        for chunk, extra in frames:
+            chunk.columns = [str(column).strip().lower() for column in chunk.columns]
+            if statement is None:
+                columns = [column for column in chunk.columns if column in table_columns]
+                skipped = [column for column in chunk.columns if column not in table_columns]
+                if skipped:
+                    logger.info(f"Skipping columns not in {table}: {skipped}")
+                columns += [column for column in defaults if column not in columns]
+                statement = self._insert_statement(table, columns, upsert)
+
+            for column, value in defaults.items():
+                if column not in chunk.columns:
+                    chunk[column] = value
+            chunk = chunk[columns]
+            values = chunk.astype(object).where(chunk.notna(), None)
+
+            with self.conn:
+                self.conn.executemany(statement, values.itertuples(index=False, name=None))
+                for sql, params in extra:
+                    self.conn.execute(sql, params)
+            rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Loaded {rows} rows into {table} ({rows / elapsed:.0f} rows/sec)")
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Finished loading {rows} rows into {table} in {elapsed:.2f}s "
+                    f"({rows / elapsed if elapsed else rows:.0f} rows/sec)")
+        return rows
+
+    def load_table(self, file_path, table, defaults=None, upsert=None):
+        """
+        Stream a file into a table chunk by chunk, committing each chunk on its own.
+
+        Args:
+            file_path (str): Path to a CSV, Parquet or Arrow IPC file
+            table (str): Target table
+            defaults (dict): Values for columns missing from the file
+            upsert (bool): Upsert on the table's key; None uses the agent's `upsert` setting
+
+        Returns:
+            int: Number of rows written
+        """
+        column_types = table_column_types(self.cursor, table)
+        frames = ((chunk, []) for chunk in read_frames(file_path, self.chunksize, column_types))
+        return self._write_frames(table, frames, defaults, upsert)
+
+    @staticmethod
+    def _fingerprint(file_path, n_bytes):
+        with open(file_path, 'rb') as f:
+            return hashlib.sha256(f.read(n_bytes)).hexdigest()
+
+    def get_watermark(self, source):
+        """Return (fingerprint, fingerprint_bytes, byte_offset, rows_loaded) for a source, or None."""
+        self.cursor.execute(WATERMARKS_DDL)
+        return self.cursor.execute("""
+            SELECT fingerprint, fingerprint_bytes, byte_offset, rows_loaded
+            FROM ingestion_watermarks WHERE source = ?
+        """, (source,)).fetchone()
+
+    def _new_rows(self, file_path, source, offset, rows_loaded, growing=False):
+        """
+        Yield (DataFrame, watermark update) pairs for the lines after `offset`.
+
+        Assumes one record per line (no quoted newlines), as event exports are. In a
+        `growing` file a final line without a newline may still be being written, so it is
+        left for the next load and the offset stays at its start.
+        """
+        with open(file_path, 'rb') as f:
+            header = f.readline()
+            offset = max(offset, f.tell())
+            f.seek(offset)
+            while True:
+                lines = list(itertools.islice(f, self.chunksize))
+                if growing and lines and not lines[-1].endswith(b'\n'):
+                    logger.info(f"Holding back the unterminated last line of {source} until it is complete")
+                    lines.pop()
+                if not lines:
+                    break
+                data = b''.join(lines)
+                offset += len(data)
+                chunk = pd.read_csv(io.BytesIO(header + data))
+                rows_loaded += len(chunk)
+                yield chunk, [self._watermark_update(file_path, source, offset, rows_loaded)]
+
+    def _new_columnar_rows(self, file_path, source, table, rows_loaded):
+        """
+        Yield (DataFrame, watermark update) pairs for the rows of a Parquet/Arrow file
+        after the first `rows_loaded`. Columnar files are rewritten rather than appended,
+        so the byte offset recorded is always the file size and resuming goes by row count.
+        """
+        size = os.path.getsize(file_path)
+        column_types = table_column_types(self.cursor, table)
+        for chunk in read_frames(file_path, self.chunksize, column_types, skip_rows=rows_loaded):
+            rows_loaded += len(chunk)
+            yield chunk, [self._watermark_update(file_path, source, size, rows_loaded)]
+
+    def _ensure_source_column(self, table):
+        """Add the source_file column (and its index) that incremental loads tag rows with."""
+        columns = [row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+        if not columns:
+            raise ValueError(f"Table {table} does not exist in {self.db_path}")
+        with self.conn:
+            if 'source_file' not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN source_file TEXT")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_source_file ON {table}(source_file)")
+
+    def _forget_source(self, table, source, rows_loaded):
+        """
+        Delete the rows earlier loads took from `source` together with its watermark, in one
+        transaction, so reloading the file replaces those rows instead of appending them again.
+
+        Raises:
+            ValueError: If the watermark counts rows that carry no source_file (loaded before
+                sources were recorded), which cannot be told apart from other rows
+        """
+        tagged = self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE source_file = ?", (source,)).fetchone()[0]
+        if tagged < rows_loaded:
+            raise ValueError(f"{rows_loaded - tagged} rows loaded into {table} from {source} were loaded before "
+                             f"sources were recorded; delete them before reloading the file")
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {table} WHERE source_file = ?", (source,))
+            self.conn.execute("DELETE FROM ingestion_watermarks WHERE source = ?", (source,))
+        if tagged:
+            logger.info(f"Removed {tagged} rows previously loaded into {table} from {source}")
+
+    def _watermark_update(self, file_path, source, offset, rows_loaded):
+        """
+        The (sql, params) recording that `source` has been loaded up to `offset`.
+
+        For Parquet/Arrow files the fingerprint covers the schema and leading rows, and
+        fingerprint_bytes holds that row count.
+        """
+        if is_columnar(file_path):
+            fingerprint_bytes = min(rows_loaded, FINGERPRINT_ROWS)
+            fingerprint = fingerprint_rows(file_path, fingerprint_bytes)
+        else:
+            fingerprint_bytes = min(offset, FINGERPRINT_BYTES)
+            fingerprint = self._fingerprint(file_path, fingerprint_bytes)
+        return ("""
+            INSERT INTO ingestion_watermarks
+                (source, fingerprint, fingerprint_bytes, byte_offset, rows_loaded, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (source) DO UPDATE SET
+                fingerprint = excluded.fingerprint,
+                fingerprint_bytes = excluded.fingerprint_bytes,
+                byte_offset = excluded.byte_offset,
+                rows_loaded = excluded.rows_loaded,
+                updated_at = excluded.updated_at
+        """, (source, fingerprint, fingerprint_bytes, offset, rows_loaded))
+
+    def load_incremental(self, file_path, table, defaults=None, from_start=False, growing=False):
+        """
+        Append only the rows added to a file since the last load.
+
+        Progress is kept per source file in ingestion_watermarks as a byte offset plus a
+        hash of the file's leading bytes, updated in the same transaction as each chunk,
+        so replaying an unchanged file loads nothing. A file whose leading bytes changed,
+        or that shrank, is treated as a new file and loaded from the start. Parquet and
+        Arrow files resume by row count as long as their schema and leading rows are
+        unchanged and they have not lost rows.
+        Rows are tagged with their source file, and whenever a file is loaded from the
+        start the rows earlier loads took from it are deleted first.
+
+        Args:
+            file_path (str): Path to a CSV, Parquet or Arrow IPC file
+            table (str): Target table
+            defaults (dict): Values for columns missing from the file
+            from_start (bool): Ignore the stored watermark and load the whole file again
+            growing (bool): The file may still be appended to, so an unterminated last
+                CSV line is left for a later load instead of being read now
+
+        Returns:
+            int: Number of rows written
+        """
+        source = str(Path(file_path).resolve())
+        size = os.path.getsize(file_path)
+        columnar = is_columnar(file_path)
+        self._ensure_source_column(table)
+        defaults = {**(defaults or {}), 'source_file': source}
+        offset, rows_loaded = 0, 0
+        resume = False
+        watermark = self.get_watermark(source)
+        if watermark and from_start:
+            logger.info(f"Reloading {source} from the start")
+        elif watermark:
+            fingerprint, fingerprint_bytes, stored_offset, stored_rows = watermark
+            if columnar:
+                resume = (count_rows(file_path) >= stored_rows
+                          and fingerprint_rows(file_path, fingerprint_bytes) == fingerprint)
+            else:
+                resume = (stored_offset <= size
+                          and self._fingerprint(file_path, fingerprint_bytes) == fingerprint)
+            if resume:
+                offset, rows_loaded = stored_offset, stored_rows
+            else:
+                logger.warning(f"{source} was replaced since the last load; loading it from the start")
+        if not resume:
+            self._forget_source(table, source, watermark[3] if watermark else 0)
+
+        if columnar:
+            total = count_rows(file_path)
+            if rows_loaded >= total:
+                logger.info(f"No new rows in {source} ({rows_loaded} of {total} rows already loaded)")
+                return 0
+            logger.info(f"Loading {source} from row {rows_loaded} of {total}")
+            return self._write_frames(table, self._new_columnar_rows(file_path, source, table, rows_loaded), defaults)
+
+        if offset >= size:
+            logger.info(f"No new rows in {source} (watermark at byte {offset})")
+            return 0
+        logger.info(f"Loading {source} from byte {offset} of {size}")
+        return self._write_frames(table, self._new_rows(file_path, source, offset, rows_loaded, growing), defaults)
+
     def load_customers(self, file_path):
         """
-        Load customer data from CSV into customer_sessions table.
-        
+        Load customer data from CSV, Parquet or Arrow into customer_sessions table.
+
+        Customers are always upserted on customer_id, so re-running the pipeline refreshes
+        existing profiles instead of failing before the event logs are reached.
+
         Args:
-            file_path (str): Path to customers.csv
+            file_path (str): Path to customers.csv (or .parquet/.arrow)
         """
         try:
-            df = pd.read_csv(file_path)
-            
-            # Insert into database
-            for _, row in df.iterrows():
-                self.cursor.execute("""
-                    INSERT INTO customer_sessions (customer_id, age, gender, location, start_time)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (row['customer_id'], row['age'], row['gender'], row['location'], datetime.now()))
-            
-            self.conn.commit()
-            logger.info(f"Loaded {len(df)} customer records")
-            
+            now = datetime.now().isoformat(sep=' ', timespec='seconds')
+            rows = self.load_table(file_path, 'customer_sessions', defaults={'last_active': now}, upsert=True)
+            logger.info(f"Loaded {rows} customer records")
+
         except Exception as e:
             logger.error(f"Error loading customers: {e}")
             raise
 
-    def load_event_logs(self, file_path):
+    def load_event_logs(self, file_path, incremental=True, growing=False):
         """
-        Load event logs from CSV into event_logs table.
-        
+        Load event logs from CSV, Parquet or Arrow into event_logs table.
+
         Args:
-            file_path (str): Path to event_logs.csv
+            file_path (str): Path to event_logs.csv (or .parquet/.arrow)
+            incremental (bool): Append only rows added since the last load of this file;
+                when False the whole file is loaded again
+            growing (bool): The file is an export still being appended to (see load_incremental);
+                uploads and one-off loads are complete files
         """
         try:
-            df = pd.read_csv(file_path)
-            
-            # Insert into database
-            for _, row in df.iterrows():
-                self.cursor.execute("""
-                    INSERT INTO event_logs (session_id, customer_id, category, dwell_time, event_type, product_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (row['session_id'], row['customer_id'], row['category'], 
-                     row['dwell_time'], row['event_type'], row['product_id']))
-            
-            self.conn.commit()
-            logger.info(f"Loaded {len(df)} event logs")
-            
+            # Exports without a timestamp column are stamped with the load time
+            now = datetime.now().isoformat(sep=' ', timespec='seconds')
+            rows = self.load_incremental(file_path, 'event_logs', defaults={'timestamp': now},
+                                         from_start=not incremental, growing=growing)
+            logger.info(f"Loaded {rows} event logs")
+
         except Exception as e:
             logger.error(f"Error loading event logs: {e}")
             raise
@@ -91,18 +377,21 @@ class CustomerLoaderAgent:
         """Execute the customer loader agent"""
         try:
             self.connect_db()
-            
+
             # Load customers data
             if self.input_file.exists():
                 self.load_customers(self.input_file)
             else:
                 logger.warning(f"Customers file not found: {self.input_file}")
-            
-            # Load event logs data if it exists in the same directory
-            event_logs_file = self.input_file.parent / "event_logs.csv"
-            if event_logs_file.exists():
-                self.load_event_logs(event_logs_file)
-            
+
+            # Load event logs data if it exists in the same directory, preferring a columnar export
+            for name in EVENT_LOG_FILES:
+                event_logs_file = self.input_file.parent / name
+                if event_logs_file.exists():
+                    # The export next to the customers file is appended to between runs
+                    self.load_event_logs(event_logs_file, incremental=self.incremental, growing=True)
+                    break
+
         except Exception as e:
             logger.error(f"Error in customer loader agent: {e}")
             raise
@@ -113,12 +402,21 @@ class CustomerLoaderAgent:
 def main():
     parser = argparse.ArgumentParser(description='Load customer data into the database')
     parser.add_argument('--input', type=str, required=True,
-                      help='Path to input CSV file containing customer data')
-    
+                      help='Path to input CSV, Parquet or Arrow file containing customer data')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                      help='Rows read and committed per transaction')
+    parser.add_argument('--upsert', action='store_true',
+                      help='Update event rows whose interaction_id already exists instead of failing '
+                           '(customers are always upserted)')
+
+    parser.add_argument('--full-reload', action='store_true',
+                      help='Load the whole event log file instead of only rows added since the last run')
+
     args = parser.parse_args()
-    
-    agent = CustomerLoaderAgent(args.input)
+
+    agent = CustomerLoaderAgent(args.input, chunksize=args.chunksize, upsert=args.upsert,
+                                incremental=not args.full_reload)
     agent.run()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
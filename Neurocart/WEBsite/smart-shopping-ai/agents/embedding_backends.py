@@ -0,0 +1,118 @@
+import sys
+import json
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# The hashing backend lives in Neurocart/shared so the web app and the bot embed identically
+sys.path.append(str(Path(__file__).parent.parent.parent.parent.absolute() / 'shared'))
+from hashing_embedding import HashingBackend
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent.absolute() / 'config' / 'embedding.json'
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class OllamaBackend:
+    """
+    Embeddings from a model served by Ollama's /api/embeddings endpoint.
+
+    Requests go through one pooled requests.Session from a bounded thread pool, so a
+    server that handles N requests in parallel embeds a catalog roughly N times faster.
+    Connection errors, timeouts, 429 and 5xx responses are retried with exponential
+    backoff and jitter.
+    """
+
+    def __init__(self, url='http://localhost:11434/api/embeddings', model='tinyllama', concurrency=8,
+                 timeout=30.0, max_retries=3, backoff=0.5, progress_every=500):
+        self.url = url
+        self.model = model
+        self.model_id = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.progress_every = progress_every
+
+        # One keep-alive connection per worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def embed(self, text):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, json={'model': self.model, 'prompt': text},
+                                             timeout=self.timeout)
+                if response.status_code == 200:
+                    return np.array(response.json()['embedding'], dtype=np.float32)
+                if response.status_code not in RETRY_STATUSES:
+                    raise Exception(f"Ollama API error: {response.text}")
+                error = Exception(f"Ollama API error {response.status_code}: {response.text}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+        raise error
+
+    def embed_many(self, texts):
+        """
+        Embed a list of texts concurrently, logging progress every `progress_every` texts.
+        
+        Returns:
+            np.ndarray: (len(texts), dim) float32 matrix
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        vectors = [None] * len(texts)
+        done = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(texts)))) as pool:
+            futures = {pool.submit(self.embed, text): i for i, text in enumerate(texts)}
+            try:
+                for future in as_completed(futures):
+                    vectors[futures[future]] = future.result()
+                    done += 1
+                    if done % self.progress_every == 0 or done == len(texts):
+                        rate = done / (time.perf_counter() - start)
+                        logger.info(f"Embedded {done}/{len(texts)} texts ({rate:.1f}/sec)")
+            except Exception:
+                # Don't leave queued requests running after the first hard failure
+                for future in futures:
+                    future.cancel()
+                raise
+        return np.vstack(vectors)
+
+def load_embedding_backend(config_path=DEFAULT_CONFIG_PATH):
+    """
+    Build the embedding backend selected in config/embedding.json.
+    
+    Falls back to Ollama with its defaults when the config file is missing.
+    """
+    config_path = Path(config_path)
+    config = {}
+    if config_path.exists():
+        with open(config_path) as f:
+            config = json.load(f)
+
+    backend = config.get('backend', 'ollama')
+    if backend == 'ollama':
+        return OllamaBackend(**config.get('ollama', {}))
+    if backend == 'hashing':
+        return HashingBackend(**config.get('hashing', {}))
+    raise ValueError(f"Unknown embedding backend in {config_path}: {backend}")
@@ -1,13 +1,18 @@
 import os
 import sqlite3
-import pandas as pd
 import numpy as np
 import argparse
 from pathlib import Path
 import logging
-import pickle
 import json
-import requests
+import sys
+import hashlib
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+from agents.vector_store import VectorStore, DTYPES
+from agents.ann_index import IVFIndex
+from agents.embedding_backends import load_embedding_backend
+from agents.columnar import read_frame, table_column_types
 
 # Set up logging
 logging.basicConfig(
@@ -16,8 +21,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PRODUCT_COLUMNS = ['product_id', 'name', 'description', 'price', 'category', 'popularity', 'stock']
+
+# Same columns as product_catalog; TEMP keeps staging rows out of the main database file
+STAGING_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS product_catalog_staging (
+        product_id TEXT PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        price REAL NOT NULL,
+        category TEXT NOT NULL,
+        popularity INTEGER DEFAULT 0,
+        stock INTEGER DEFAULT 0
+    )
+"""
+
 class ProductCatalogAgent:
-    def __init__(self, input_file):
+    def __init__(self, input_file, vector_dtype='float32', embedding_backend=None, sync=True):
         # Get the absolute path to the project root
         self.project_root = Path(__file__).parent.parent.absolute()
         
@@ -25,10 +45,25 @@ class ProductCatalogAgent:
         self.db_path = self.project_root / 'database' / 'data.db'
         self.input_file = Path(input_file)
         self.embeddings_dir = self.project_root / 'embeddings'
+        self.vector_store_prefix = self.embeddings_dir / 'product_vectors'
+        self.vector_dtype = vector_dtype
+        self.ann_index_path = self.embeddings_dir / 'product_ann.npz'
+        
+        # Diff the file against the table instead of deleting and reinserting every product
+        self.sync = sync
+        self.changes = None
+        
+        # Embedding backend (Ollama or in-process hashing) chosen in config/embedding.json
+        self.embedding_backend = embedding_backend or load_embedding_backend()
         
         # Ensure embeddings directory exists
         os.makedirs(self.embeddings_dir, exist_ok=True)
         
+        # Filled by generate_embeddings for save_embeddings / update_ann_index
+        self.content_hashes = {}
+        self.changed_ids = []
+        self.removed_ids = []
+        
         self.conn = None
         self.cursor = None
 
@@ -41,30 +76,41 @@ class ProductCatalogAgent:
             logger.error(f"Failed to connect to database: {e}")
             raise
 
+    def product_rows(self, df):
+        """Rows in PRODUCT_COLUMNS order, with the numeric columns cast as product_catalog expects."""
+        return list(zip(
+            df['product_id'].tolist(),
+            df['name'].tolist(),
+            df['description'].tolist(),
+            df['price'].astype(float).tolist(),
+            df['category'].tolist(),
+            df['popularity'].astype(float).astype(int).tolist(),
+            df['stock'].astype(float).astype(int).tolist()
+        ))
+
     def load_products(self):
         try:
-            df = pd.read_csv(self.input_file)
-            
-            # Clear existing products
-            self.cursor.execute("DELETE FROM product_catalog")
-            
-            # Insert products
-            for _, row in df.iterrows():
-                self.cursor.execute("""
-                    INSERT INTO product_catalog 
-                    (product_id, name, description, price, category, popularity, stock)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    row['product_id'],
-                    row['name'],
-                    row['description'],
-                    float(row['price']),
-                    row['category'],
-                    int(row['popularity']),
-                    int(row['stock'])
-                ))
+            # CSV, Parquet or Arrow IPC; columnar input is cast to the table's column types
+            df = read_frame(self.input_file, table_column_types(self.cursor, 'product_catalog'))
+            
+            # A row without an ID cannot be matched against the catalog or embedded
+            missing_id = df['product_id'].isna() | (df['product_id'].astype(str).str.strip() == '')
+            if missing_id.any():
+                logger.warning(f"Skipping {int(missing_id.sum())} products without a product_id")
+                df = df[~missing_id].reset_index(drop=True)
+            
+            if self.sync:
+                self.changes = self.sync_products(df)
+            else:
+                # Clear existing products and insert them all again
+                self.cursor.execute("DELETE FROM product_catalog")
+                self.cursor.executemany(f"""
+                    INSERT INTO product_catalog ({', '.join(PRODUCT_COLUMNS)})
+                    VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))})
+                """, self.product_rows(df))
+                self.conn.commit()
+                self.changes = None
             
-            self.conn.commit()
             logger.info(f"Loaded {len(df)} products")
             return df
             
@@ -72,36 +118,142 @@ class ProductCatalogAgent:
             logger.error(f"Error loading products: {e}")
             raise
 
+    def sync_products(self, df):
+        """
+        Bring product_catalog in line with `df`, writing only the rows that differ.
+        
+        The file is first copied into a TEMP staging table, which takes no lock on the
+        main database. Inserts, updates and deletes are then worked out and applied with
+        set-based SQL in one short write transaction, so readers see either the old or
+        the new catalog and never an empty or partial one.
+        
+        Args:
+            df (pd.DataFrame): The full incoming catalog
+            
+        Returns:
+            dict: Product IDs that were 'inserted', 'updated' and 'deleted'
+        """
+        columns = ', '.join(PRODUCT_COLUMNS)
+        
+        def differs(new, old):
+            return ' OR '.join(f"{new}.{column} IS NOT {old}.{column}" for column in PRODUCT_COLUMNS[1:])
+        
+        self.cursor.execute(STAGING_DDL)
+        self.cursor.execute("DELETE FROM product_catalog_staging")
+        self.cursor.executemany(f"""
+            INSERT INTO product_catalog_staging ({columns})
+            VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))})
+        """, self.product_rows(df))
+        self.conn.commit()
+        
+        try:
+            # Take the write lock up front so the diff cannot go stale before it is applied
+            self.cursor.execute("BEGIN IMMEDIATE")
+            inserted = [row[0] for row in self.cursor.execute("""
+                SELECT product_id FROM product_catalog_staging s
+                WHERE NOT EXISTS (SELECT 1 FROM product_catalog c WHERE c.product_id = s.product_id)
+            """)]
+            updated = [row[0] for row in self.cursor.execute(f"""
+                SELECT s.product_id
+                FROM product_catalog_staging s
+                JOIN product_catalog c ON c.product_id = s.product_id
+                WHERE {differs('s', 'c')}
+            """)]
+            not_staged = """
+                NOT EXISTS (SELECT 1 FROM product_catalog_staging s
+                            WHERE s.product_id = product_catalog.product_id)
+            """
+            deleted = [row[0] for row in self.cursor.execute(
+                f"SELECT product_id FROM product_catalog WHERE {not_staged}"
+            )]
+            
+            # A correlated UPDATE and INSERT ... WHERE NOT EXISTS rather than an upsert, which
+            # would need a unique key that a table recreated by /api/upload does not have (and
+            # UPDATE ... FROM, which needs SQLite 3.33). Each subquery is a lookup on the staging
+            # table's primary key; unchanged rows (and their index entries) are left untouched.
+            staged = "product_catalog_staging s WHERE s.product_id = product_catalog.product_id"
+            self.cursor.execute(f"DELETE FROM product_catalog WHERE {not_staged}")
+            self.cursor.execute(f"""
+                UPDATE product_catalog SET
+                    {', '.join(f"{column} = (SELECT s.{column} FROM {staged})" for column in PRODUCT_COLUMNS[1:])}
+                WHERE EXISTS (SELECT 1 FROM {staged} AND ({differs('s', 'product_catalog')}))
+            """)
+            self.cursor.execute(f"""
+                INSERT INTO product_catalog ({columns})
+                SELECT {columns} FROM product_catalog_staging s
+                WHERE NOT EXISTS (SELECT 1 FROM product_catalog c WHERE c.product_id = s.product_id)
+            """)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.cursor.execute("DROP TABLE IF EXISTS product_catalog_staging")
+        
+        changes = {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+        logger.info(f"Catalog sync: {len(inserted)} inserted, {len(updated)} updated, "
+                    f"{len(deleted)} deleted, {len(df) - len(inserted) - len(updated)} unchanged")
+        return changes
+
+    def ensure_embedding_metadata(self):
+        """Add the content_hash / model_id columns to product_embeddings on databases created before them."""
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(product_embeddings)")]
+        for column in ('content_hash', 'model_id'):
+            if column not in columns:
+                self.cursor.execute(f"ALTER TABLE product_embeddings ADD COLUMN {column} TEXT")
+        # Vectors live in the vector store now; drop pickled copies left by older versions
+        self.cursor.execute("UPDATE product_embeddings SET vector_blob = NULL WHERE vector_blob IS NOT NULL")
+        self.conn.commit()
+
+    def load_previous_embeddings(self):
+        """Vectors from the last run, keyed by product ID (empty if there are none)."""
+        if not VectorStore.exists(self.vector_store_prefix):
+            return {}
+        store = VectorStore.load(self.vector_store_prefix)
+        # The store keeps unit vectors plus their norms; scale back to the raw embeddings
+        matrix = store.vectors() * store.norms[:, None]
+        return dict(zip(store.ids, matrix))
+
     def generate_embeddings(self, products_df):
+        """
+        Embed new and changed products, reusing the stored vectors of unchanged ones.
+        
+        A product is unchanged when the SHA-256 of its embedded text (name + description)
+        and the embedding model both match what product_embeddings recorded last run.
+        """
         try:
-            embeddings = {}
-            
-            for _, row in products_df.iterrows():
-                # Combine product name and description
-                text = f"{row['name']} {row['description']}"
-                
-                # Get embedding from Ollama API
-                response = requests.post(
-                    'http://localhost:11434/api/embeddings',
-                    json={
-                        'model': 'tinyllama',
-                        'prompt': text
-                    }
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Ollama API error: {response.text}")
-                
-                # Parse embedding from response
-                embedding = np.array(response.json()['embedding'])
-                embeddings[row['product_id']] = embedding
-                
-                logger.info(f"Generated embedding for product {row['product_id']}")
-            
-            # Save embeddings to file
-            embeddings_file = self.embeddings_dir / 'product_vectors.pkl'
-            with open(embeddings_file, 'wb') as f:
-                pickle.dump(embeddings, f)
+            # Combine product name and description
+            texts = (products_df['name'].fillna('').astype(str) + ' ' +
+                     products_df['description'].fillna('').astype(str)).tolist()
+            product_ids = products_df['product_id'].tolist()
+            model_id = self.embedding_backend.model_id
+            hashes = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+            self.content_hashes = dict(zip(product_ids, hashes))
+            
+            self.ensure_embedding_metadata()
+            stored = {row[0]: (row[1], row[2]) for row in self.cursor.execute(
+                "SELECT product_id, content_hash, model_id FROM product_embeddings")}
+            previous = self.load_previous_embeddings()
+            
+            changed = [i for i, (product_id, content_hash) in enumerate(zip(product_ids, hashes))
+                       if stored.get(product_id) != (content_hash, model_id) or product_id not in previous]
+            self.changed_ids = [product_ids[i] for i in changed]
+            self.removed_ids = [product_id for product_id in stored if product_id not in self.content_hashes]
+            logger.info(f"{len(changed)} of {len(product_ids)} products are new or changed; "
+                        f"{len(self.removed_ids)} removed")
+            
+            # Get embeddings for new and changed products from the configured backend
+            matrix = self.embedding_backend.embed_many([texts[i] for i in changed]) if changed else None
+            fresh = {product_ids[i]: matrix[row] for row, i in enumerate(changed)}
+            embeddings = {product_id: fresh[product_id] if product_id in fresh else previous[product_id]
+                          for product_id in product_ids}
+            logger.info(f"Embedded {len(changed)} products with {model_id}")
+            
+            # Save one contiguous matrix (memory-mapped by readers) with its product-ID index
+            if embeddings:
+                store = VectorStore.build(list(embeddings.keys()), np.vstack(list(embeddings.values())),
+                                          dtype=self.vector_dtype)
+                store.save(self.vector_store_prefix)
             
             logger.info(f"Generated embeddings for {len(embeddings)} products")
             return embeddings
@@ -111,24 +263,68 @@ class ProductCatalogAgent:
             raise
 
     def save_embeddings(self, embeddings):
+        """
+        Record content hashes for new and changed products and delete rows of removed ones.
+        
+        The vectors themselves are only kept in the vector store written by generate_embeddings.
+        """
         try:
-            # Clear existing embeddings
-            self.cursor.execute("DELETE FROM product_embeddings")
-            
-            # Insert embeddings
-            for product_id, vector in embeddings.items():
-                self.cursor.execute("""
-                    INSERT INTO product_embeddings (product_id, vector_blob)
-                    VALUES (?, ?)
-                """, (product_id, pickle.dumps(vector)))
+            model_id = self.embedding_backend.model_id
+            self.cursor.executemany("DELETE FROM product_embeddings WHERE product_id = ?",
+                                    [(product_id,) for product_id in self.removed_ids])
+            self.cursor.executemany("""
+                INSERT INTO product_embeddings (product_id, content_hash, model_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (product_id) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    model_id = excluded.model_id
+            """, [(product_id, self.content_hashes[product_id], model_id) for product_id in self.changed_ids])
             
             self.conn.commit()
-            logger.info(f"Saved {len(embeddings)} embeddings to database")
+            logger.info(f"Recorded content hashes for {len(self.changed_ids)} products, "
+                        f"deleted {len(self.removed_ids)}")
             
         except Exception as e:
             logger.error(f"Error saving embeddings: {e}")
             raise
 
+    def update_ann_index(self, embeddings):
+        """
+        Bring the ANN index in line with the current catalog.
+        
+        Products that disappeared are deleted and new or re-embedded products are
+        inserted in place; the quantizer is only retrained when the index is new,
+        the vector size changed, or the catalog has grown well past its training size.
+        """
+        try:
+            if not embeddings:
+                return None
+            
+            ids = list(embeddings.keys())
+            matrix = np.vstack(list(embeddings.values()))
+            
+            index = IVFIndex.load(self.ann_index_path) if self.ann_index_path.exists() else None
+            if index is None or index.dim != matrix.shape[1]:
+                index = IVFIndex.build(ids, matrix)
+            else:
+                removed = [product_id for product_id in index.ids if product_id is not None and product_id not in embeddings]
+                index.delete(removed)
+                # Only products that were (re-)embedded this run, plus any the index is missing
+                changed = set(self.changed_ids)
+                upserts = [product_id for product_id in ids if product_id in changed or product_id not in index]
+                if upserts:
+                    index.add(upserts, np.vstack([embeddings[product_id] for product_id in upserts]))
+                if index.needs_retrain():
+                    index = IVFIndex.build(ids, matrix)
+                logger.info(f"ANN index updated: {len(upserts)} upserted, {len(removed)} removed")
+            
+            index.save(self.ann_index_path)
+            return index
+            
+        except Exception as e:
+            logger.error(f"Error updating ANN index: {e}")
+            raise
+
     def run(self):
         try:
             self.connect_db()
@@ -142,6 +338,11 @@ class ProductCatalogAgent:
             # Save embeddings
             self.save_embeddings(embeddings)
             
+            # Keep the ANN index in sync with the reloaded catalog
+            self.update_ann_index(embeddings)
+            
+            return self.changes
+            
         except Exception as e:
             logger.error(f"Error in product catalog agent: {e}")
             raise
@@ -153,11 +354,17 @@ def main():
     parser = argparse.ArgumentParser(description='Product Catalog Agent')
     parser.add_argument('--input', type=str, required=True,
                       help='Path to input CSV file containing product data')
+    parser.add_argument('--vector-dtype', type=str, default='float32', choices=DTYPES,
+                      help='Storage precision for the product vector store')
+    parser.add_argument('--full-reload', action='store_true',
+                      help='Delete and reinsert every product instead of applying only the differences')
     
     args = parser.parse_args()
     
-    agent = ProductCatalogAgent(args.input)
-    agent.run()
+    agent = ProductCatalogAgent(args.input, vector_dtype=args.vector_dtype, sync=not args.full_reload)
+    changes = agent.run()
+    if changes:
+        print(json.dumps({kind: len(ids) for kind, ids in changes.items()}))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
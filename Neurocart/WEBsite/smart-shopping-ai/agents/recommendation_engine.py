@@ -5,8 +5,15 @@ import numpy as np
 from pathlib import Path
 import json
 import logging
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+from agents.ann_index import IVFIndex
+from agents.vector_store import VectorStore
+from agents.segment_popularity import get_segment_top_products
 
 # Set up logging
 logging.basicConfig(
@@ -15,18 +22,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Interest weight per event type; anything else (e.g. view) counts once
+EVENT_WEIGHTS = {
+    'click': 1,
+    'add_to_cart': 2,
+    'purchase': 3
+}
+
+# Cap on customers x products scores held in memory at once by batch runs
+SCORE_BLOCK_CELLS = 1 << 24
+
+# Per-process state of parallel batch workers, set up by _init_worker
+_worker = None
+
+def _init_worker(candidate_pool, batch_size, segment_prefs, popular, n_recommendations):
+    """Memory-map the vector store (sharing its pages with every other worker) and load the ANN index once."""
+    global _worker
+    engine = RecommendationEngine(candidate_pool=candidate_pool, batch_size=batch_size)
+    engine.load_embeddings()
+    engine.load_ann_index()
+    _worker = (engine, segment_prefs, popular, n_recommendations)
+
+def _score_shard(shard):
+    """Score one shard of customers; the parent process writes the results."""
+    engine, segment_prefs, popular, n_recommendations = _worker
+    customers, interests, has_history, customer_segments = shard
+    results = []
+    for block in engine.score_customers(customers, interests, has_history, customer_segments,
+                                        segment_prefs, popular, n_recommendations):
+        results.extend(block)
+    return results
+
 class RecommendationEngine:
-    def __init__(self):
+    def __init__(self, candidate_pool=200, batch=True, batch_size=1024, workers=1):
         # Get the absolute path to the project root
         self.project_root = Path(__file__).parent.parent.absolute()
         
         # Set up paths
         self.db_path = self.project_root / 'database' / 'data.db'
-        self.embeddings_path = self.project_root / 'embeddings' / 'product_vectors.pkl'
+        self.vector_store_prefix = self.project_root / 'embeddings' / 'product_vectors'
+        self.ann_index_path = self.project_root / 'embeddings' / 'product_ann.npz'
+        
+        # Number of ANN candidates scored per customer when an index is available
+        self.candidate_pool = candidate_pool
+        
+        # Score all customers from a few set-based queries instead of querying per customer
+        self.batch = batch
+        self.batch_size = batch_size
+        # Batch mode only: worker processes scoring shards of customers in parallel
+        self.workers = max(1, workers)
         
         self.conn = None
         self.cursor = None
-        self.product_embeddings = None
+        self.vector_store = None
+        self.ann_index = None
 
     def connect_db(self):
         try:
@@ -38,14 +87,66 @@ class RecommendationEngine:
             raise
 
     def load_embeddings(self):
+        """
+        Memory-map the product vector store written by the product catalog agent.
+        
+        Only the ID index is read eagerly, so startup cost and private memory stay flat as
+        the catalog grows and every process scoring products shares the same page cache.
+        """
         try:
-            with open(self.embeddings_path, 'rb') as f:
-                self.product_embeddings = pickle.load(f)
-            logger.info(f"Loaded embeddings for {len(self.product_embeddings)} products")
+            if not VectorStore.exists(self.vector_store_prefix):
+                raise FileNotFoundError(f"No product vector store at {self.vector_store_prefix}.ids.json; "
+                                        "run the process_products step first")
+            self.vector_store = VectorStore.load(self.vector_store_prefix, mmap=True)
+            logger.info(f"Loaded {self.vector_store.dtype} embeddings for {len(self.vector_store)} products")
         except Exception as e:
             logger.error(f"Error loading embeddings: {e}")
             raise
 
+    def load_ann_index(self):
+        try:
+            if self.ann_index_path.exists():
+                self.ann_index = IVFIndex.load(self.ann_index_path)
+                logger.info(f"Loaded ANN index with {len(self.ann_index)} products")
+            else:
+                logger.info("No ANN index found; scoring every product")
+        except Exception as e:
+            logger.error(f"Error loading ANN index, falling back to brute force: {e}")
+            self.ann_index = None
+
+    def interest_vector(self, interests):
+        """
+        Weighted sum of the unit vectors of the products a customer interacted with.
+        
+        Returns:
+            tuple: (summed vector, vector-store rows of the interacted products); the
+            vector is None when none of them have an embedding
+        """
+        rows = np.array([self.vector_store.index[product_id] for product_id in interests
+                         if product_id in self.vector_store], dtype=np.int64)
+        if len(rows) == 0:
+            return None, rows
+        # float64 like the batch path, so both build the same query
+        weights = np.array([interests[self.vector_store.ids[row]] for row in rows], dtype=np.float64)
+        return weights @ self.vector_store.vectors(rows).astype(np.float64), rows
+
+    def get_candidates(self, query, exclude_rows):
+        """
+        Shortlist vector-store rows with the ANN index, or return None to score every product.
+        
+        The interest-weighted mean cosine similarity is linear in the unit product
+        vector, so the best products are the nearest neighbours of the weighted sum
+        of the customer's unit interest vectors.
+        """
+        # Small catalogs are cheaper (and exact) to score in full
+        if self.ann_index is None or len(self.vector_store) <= self.candidate_pool or not query.any():
+            return None
+        
+        exclude = [self.vector_store.ids[row] for row in exclude_rows]
+        neighbours = self.ann_index.search(query, k=self.candidate_pool, exclude=exclude)
+        return np.array([self.vector_store.index[product_id] for product_id, _ in neighbours
+                         if product_id in self.vector_store], dtype=np.int64)
+
     def get_customer_interests(self, customer_id):
         try:
             # Get customer's interaction history
@@ -63,17 +164,10 @@ class RecommendationEngine:
             if df.empty:
                 return None
             
-            # Weight different event types
-            weights = {
-                'click': 1,
-                'add_to_cart': 2,
-                'purchase': 3
-            }
-            
             # Calculate weighted interest score for each product
             product_scores = {}
             for _, row in df.iterrows():
-                score = weights.get(row['event_type'], 1) * row['interaction_count']
+                score = EVENT_WEIGHTS.get(row['event_type'], 1) * row['interaction_count']
                 product_scores[row['product_id']] = score
             
             return product_scores
@@ -98,25 +192,8 @@ class RecommendationEngine:
             
             segment_tag = result[0]
             
-            # Get popular products in the segment
-            query = """
-                SELECT 
-                    p.product_id,
-                    COUNT(*) as purchase_count
-                FROM event_logs e
-                JOIN customer_segments cs ON e.customer_id = cs.customer_id
-                JOIN product_catalog p ON e.product_id = p.product_id
-                WHERE cs.segment_tag = ?
-                AND e.event_type = 'purchase'
-                GROUP BY p.product_id
-                ORDER BY purchase_count DESC
-            """
-            df = pd.read_sql_query(query, self.conn, params=(segment_tag,))
-            
-            if df.empty:
-                return None
-            
-            return dict(zip(df['product_id'], df['purchase_count']))
+            # Get popular products in the segment from the materialized segment_top_products
+            return get_segment_top_products(self.conn, segment_tag).get(segment_tag)
             
         except Exception as e:
             logger.error(f"Error getting segment preferences: {e}")
@@ -148,47 +225,271 @@ class RecommendationEngine:
                 confidence_scores = [0.5] * len(recommendations)  # Lower confidence for non-personalized recs
                 return recommendations, confidence_scores
             
-            # Calculate similarity scores
-            product_scores = {}
-            for product_id, embedding in self.product_embeddings.items():
-                # Skip products the customer has already interacted with
-                if product_id in interests:
-                    continue
-                
-                # Calculate similarity with interested products
-                similarities = []
-                for int_prod_id, int_score in interests.items():
-                    if int_prod_id in self.product_embeddings:
-                        sim = cosine_similarity(
-                            embedding.reshape(1, -1),
-                            self.product_embeddings[int_prod_id].reshape(1, -1)
-                        )[0][0]
-                        similarities.append(sim * int_score)
-                
-                if similarities:
-                    # Combine similarity with segment preference
-                    score = np.mean(similarities)
-                    if segment_prefs and product_id in segment_prefs:
-                        score *= 1.2  # Boost score for products popular in segment
-                    
-                    product_scores[product_id] = score
+            return self.score_products(interests, segment_prefs, n_recommendations)
             
-            # Sort by score and get top N
-            sorted_products = sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
-            recommendations = [p[0] for p in sorted_products[:n_recommendations]]
-            confidence_scores = [p[1] for p in sorted_products[:n_recommendations]]
+        except Exception as e:
+            logger.error(f"Error generating recommendations: {e}")
+            raise
+
+    def score_products(self, interests, segment_prefs, n_recommendations=5):
+        """
+        Rank products by interest-weighted mean cosine similarity with one matrix product.
+        
+        mean_i(w_i * cos(p, i)) equals the catalog's unit vectors times the customer's
+        weighted interest vector divided by the number of interests, so each customer
+        costs a single (candidates x dim) product. Interacted products are masked out and
+        segment favourites boosted with vector masks, and the top N come from argpartition.
+        
+        Args:
+            interests (dict): Product ID -> weighted interaction score
+            segment_prefs (dict): Product ID -> purchase count in the customer's segment, or None
+            n_recommendations (int): Number of products to return
+        """
+        try:
+            query, interest_rows = self.interest_vector(interests)
+            if query is None:
+                return [], []
             
-            return recommendations, confidence_scores
+            return self.rank_products(query / len(interest_rows), interest_rows,
+                                      self.segment_rows(segment_prefs), n_recommendations)
             
         except Exception as e:
-            logger.error(f"Error generating recommendations: {e}")
+            logger.error(f"Error scoring products: {e}")
             raise
 
+    def segment_rows(self, segment_prefs):
+        """Vector-store rows of the products popular in a segment."""
+        if not segment_prefs:
+            return np.empty(0, dtype=np.int64)
+        return np.array([self.vector_store.index[product_id] for product_id in segment_prefs
+                         if product_id in self.vector_store], dtype=np.int64)
+
+    def rank_products(self, query, interest_rows, segment_rows, n_recommendations=5):
+        """Score the ANN shortlist (or the whole catalog) against a mean interest vector and take the top N."""
+        rows = self.get_candidates(query, interest_rows)
+        scores = self.vector_store.dot(query, rows)
+        return self.top_products(scores, rows, interest_rows, segment_rows, n_recommendations)
+
+    def top_products(self, scores, rows, interest_rows, segment_rows, n_recommendations=5):
+        """
+        Apply the segment boost and interacted-product exclusion as masks and return the top N.
+        
+        Args:
+            scores (np.ndarray): Similarity per candidate; modified in place
+            rows (np.ndarray): Vector-store row of each candidate, or None when `scores` covers every row
+            interest_rows (np.ndarray): Rows of products the customer interacted with
+            segment_rows (np.ndarray): Rows of products popular in the customer's segment
+            n_recommendations (int): Number of products to return
+        """
+        if rows is None:
+            # Boost score for products popular in segment
+            scores[segment_rows] *= 1.2
+            # Skip products the customer has already interacted with
+            scores[interest_rows] = -np.inf
+            rows = np.arange(len(scores))
+        else:
+            scores[np.isin(rows, segment_rows)] *= 1.2
+            scores[np.isin(rows, interest_rows)] = -np.inf
+        
+        k = min(n_recommendations, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return [], []
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        # Everything tied with the k-th score competes, and equal scores rank by product ID
+        top = np.flatnonzero(scores >= kth)
+        top = top[np.lexsort((self.vector_store.id_rank[rows[top]], -scores[top]))][:k]
+        
+        recommendations = [self.vector_store.ids[row] for row in rows[top]]
+        confidence_scores = scores[top].tolist()
+        
+        return recommendations, confidence_scores
+
+    def load_all_interests(self, customers):
+        """
+        Build the weighted customer x product interest matrix from a single scan of event_logs.
+        
+        Weights match get_customer_interests, including which event type a product's score
+        comes from when a customer has several (the last in event_type order).
+        
+        Args:
+            customers (list): Customer IDs, one per matrix row
+            
+        Returns:
+            tuple: (scipy.sparse.csr_matrix of interest weights with one column per vector-store
+            row, boolean array marking customers with any events)
+        """
+        try:
+            df = pd.read_sql_query("""
+                SELECT 
+                    customer_id,
+                    product_id,
+                    event_type,
+                    COUNT(*) as interaction_count
+                FROM event_logs
+                GROUP BY customer_id, product_id, event_type
+                ORDER BY customer_id, product_id, event_type
+            """, self.conn)
+            df = df.drop_duplicates(['customer_id', 'product_id'], keep='last')
+            
+            customer_rows = pd.Index(customers).get_indexer(df['customer_id'])
+            has_history = np.zeros(len(customers), dtype=bool)
+            has_history[customer_rows[customer_rows >= 0]] = True
+            
+            product_rows = pd.Index(self.vector_store.ids).get_indexer(df['product_id'])
+            weights = df['event_type'].map(EVENT_WEIGHTS).fillna(1).to_numpy() * df['interaction_count'].to_numpy()
+            keep = (customer_rows >= 0) & (product_rows >= 0)
+            interests = sparse.csr_matrix(
+                (weights[keep].astype(np.float32), (customer_rows[keep], product_rows[keep])),
+                shape=(len(customers), len(self.vector_store))
+            )
+            logger.info(f"Loaded {interests.nnz} customer-product interests for {has_history.sum()} customers")
+            return interests, has_history
+            
+        except Exception as e:
+            logger.error(f"Error loading customer interests: {e}")
+            raise
+
+    def load_segments(self):
+        """Customer ID -> segment tag, and segment tag -> {product ID: purchase count} in popularity order."""
+        try:
+            self.cursor.execute("SELECT customer_id, segment_tag FROM customer_segments")
+            segments = dict(self.cursor.fetchall())
+            
+            return segments, get_segment_top_products(self.conn)
+            
+        except Exception as e:
+            logger.error(f"Error loading segments: {e}")
+            raise
+
+    def load_batch_inputs(self, customers, n_recommendations=5):
+        """
+        Everything batch scoring reads from the database, loaded with a handful of set-based queries.
+        
+        Returns:
+            tuple: (interest matrix, has-history flags, segment tag per customer,
+            segment tag -> {product ID: purchase count}, overall most popular product IDs)
+        """
+        interests, has_history = self.load_all_interests(customers)
+        segments, segment_prefs = self.load_segments()
+        
+        # Overall popularity for customers with neither history nor segment favourites
+        self.cursor.execute("""
+            SELECT product_id
+            FROM product_catalog
+            ORDER BY popularity DESC
+            LIMIT ?
+        """, (n_recommendations,))
+        popular = [r[0] for r in self.cursor.fetchall()]
+        
+        return interests, has_history, [segments.get(customer_id) for customer_id in customers], segment_prefs, popular
+
+    def generate_all_recommendations(self, customers, n_recommendations=5):
+        """
+        Recommendations for every customer, scored in blocks.
+        
+        Yields:
+            list: (customer_id, recommendations, confidence_scores) per customer of a block
+        """
+        inputs = self.load_batch_inputs(customers, n_recommendations)
+        yield from self.score_customers(customers, *inputs, n_recommendations)
+
+    def score_customers(self, customers, interests, has_history, customer_segments, segment_prefs, popular,
+                        n_recommendations=5):
+        """
+        Score customers in blocks without touching the database.
+        
+        For each block, the mean interest vectors come from one sparse product with the
+        vectors of the products its customers touched. Without an ANN shortlist the block
+        is scored against the whole catalog with one matrix product.
+        
+        Args:
+            customers (list): Customer IDs
+            interests (scipy.sparse.csr_matrix): Weighted interests, one row per customer
+            has_history (np.ndarray): Whether each customer has any events
+            customer_segments (list): Segment tag (or None) per customer
+            segment_prefs (dict): Segment tag -> {product ID: purchase count}
+            popular (list): Fallback product IDs for customers without history or segment favourites
+            n_recommendations (int): Number of products per customer
+            
+        Yields:
+            list: (customer_id, recommendations, confidence_scores) per customer of a block
+        """
+        store = self.vector_store
+        segment_rows = {segment_tag: self.segment_rows(prefs) for segment_tag, prefs in segment_prefs.items()}
+        no_segment = self.segment_rows(None)
+        
+        full_scan = self.ann_index is None or len(store) <= self.candidate_pool
+        block_size = max(1, min(self.batch_size, SCORE_BLOCK_CELLS // max(len(store), 1)))
+        
+        for start in range(0, len(customers), block_size):
+            block = interests[start:start + block_size]
+            counts = np.diff(block.indptr)
+            # Only the vectors of products someone in the block interacted with are read
+            columns = np.unique(block.indices)
+            queries = (block[:, columns].astype(np.float64) @ store.vectors(columns).astype(np.float64)
+                       if len(columns) else None)
+            scored = np.flatnonzero(counts)
+            if len(scored):
+                queries = queries[scored] / counts[scored, None]
+                block_scores = store.dot_many(queries) if full_scan else None
+            
+            results = []
+            for i in range(block.shape[0]):
+                customer_id = customers[start + i]
+                segment_tag = customer_segments[start + i]
+                if not has_history[start + i]:
+                    prefs = segment_prefs.get(segment_tag)
+                    # Lower confidence for non-personalized recs
+                    recommendations = list(prefs)[:n_recommendations] if prefs else popular
+                    results.append((customer_id, recommendations, [0.5] * len(recommendations)))
+                    continue
+                if not counts[i]:
+                    # History, but none of it with products that have embeddings
+                    results.append((customer_id, [], []))
+                    continue
+                
+                j = np.searchsorted(scored, i)
+                interest_rows = block.indices[block.indptr[i]:block.indptr[i + 1]]
+                rows = segment_rows.get(segment_tag, no_segment)
+                if full_scan:
+                    ranked = self.top_products(block_scores[j], None, interest_rows, rows, n_recommendations)
+                else:
+                    ranked = self.rank_products(queries[j], interest_rows, rows, n_recommendations)
+                results.append((customer_id, *ranked))
+            yield results
+
+    def generate_parallel(self, customers, n_recommendations=5):
+        """
+        Score customers in `self.workers` processes, yielding each shard's results in order.
+        
+        The database is read once here and shards of the interest matrix are sent to the
+        workers. Each worker memory-maps the same vector store file, so the catalog
+        matrix sits in the page cache once however many workers there are. Results come
+        back to this process, the only one writing to SQLite.
+        
+        Yields:
+            list: (customer_id, recommendations, confidence_scores) per customer of a shard
+        """
+        interests, has_history, customer_segments, segment_prefs, popular = self.load_batch_inputs(
+            customers, n_recommendations)
+        
+        # A few shards per worker so an unlucky shard does not leave the others idle
+        shard_size = max(self.batch_size, -(-len(customers) // (self.workers * 4)))
+        shards = [(customers[start:start + shard_size], interests[start:start + shard_size],
+                   has_history[start:start + shard_size], customer_segments[start:start + shard_size])
+                  for start in range(0, len(customers), shard_size)]
+        logger.info(f"Scoring {len(customers)} customers in {len(shards)} shards on {self.workers} workers")
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.candidate_pool, self.batch_size, segment_prefs, popular,
+                                           n_recommendations)) as pool:
+            yield from pool.map(_score_shard, shards)
+
     def save_recommendations(self, customer_id, recommendations, confidence_scores):
         try:
             # Convert lists to JSON strings
             rec_json = json.dumps(recommendations)
-            conf_json = json.dumps(confidence_scores)
+            conf_json = json.dumps([float(score) for score in confidence_scores])
             
             # Save to database
             self.cursor.execute("""
@@ -204,19 +505,47 @@ class RecommendationEngine:
             logger.error(f"Error saving recommendations: {e}")
             raise
 
+    def save_all_recommendations(self, results):
+        """Insert one block of (customer_id, recommendations, confidence_scores) in a single transaction."""
+        try:
+            self.cursor.executemany("""
+                INSERT INTO recommendation_results 
+                (customer_id, recommendations, confidence_scores)
+                VALUES (?, ?, ?)
+            """, [(customer_id, json.dumps(recommendations), json.dumps([float(score) for score in confidence_scores]))
+                  for customer_id, recommendations, confidence_scores in results])
+            
+            self.conn.commit()
+            
+        except Exception as e:
+            logger.error(f"Error saving recommendations: {e}")
+            raise
+
     def run(self):
         try:
             self.connect_db()
             self.load_embeddings()
+            self.load_ann_index()
             
             # Get all customers
             self.cursor.execute("SELECT customer_id FROM customer_sessions")
             customers = [r[0] for r in self.cursor.fetchall()]
             
-            # Generate recommendations for each customer
-            for customer_id in customers:
-                recommendations, confidence_scores = self.generate_recommendations(customer_id)
-                self.save_recommendations(customer_id, recommendations, confidence_scores)
+            if self.batch:
+                saved = 0
+                if self.workers > 1:
+                    batches = self.generate_parallel(customers)
+                else:
+                    batches = self.generate_all_recommendations(customers)
+                for results in batches:
+                    self.save_all_recommendations(results)
+                    saved += len(results)
+                    logger.info(f"Saved recommendations for {saved}/{len(customers)} customers")
+            else:
+                # Generate recommendations for each customer
+                for customer_id in customers:
+                    recommendations, confidence_scores = self.generate_recommendations(customer_id)
+                    self.save_recommendations(customer_id, recommendations, confidence_scores)
             
             logger.info(f"Generated recommendations for {len(customers)} customers")
             
@@ -228,7 +557,17 @@ class RecommendationEngine:
                 self.conn.close()
 
 def main():
-    agent = RecommendationEngine()
+    parser = argparse.ArgumentParser(description='Recommendation Engine')
+    parser.add_argument('--per-customer', action='store_true',
+                      help='Query and score one customer at a time instead of in batches')
+    parser.add_argument('--batch-size', type=int, default=1024,
+                      help='Customers scored together in batch mode')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Processes scoring customers in parallel in batch mode')
+    
+    args = parser.parse_args()
+    
+    agent = RecommendationEngine(batch=not args.per_customer, batch_size=args.batch_size, workers=args.workers)
     agent.run()
 
 if __name__ == "__main__":
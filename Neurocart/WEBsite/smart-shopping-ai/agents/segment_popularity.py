@@ -0,0 +1,187 @@
+import re
+import sqlite3
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Purchase counts per product within a segment, most purchased first
+SEGMENT_POPULARITY_QUERY = """
+    SELECT
+        cs.segment_tag,
+        p.product_id,
+        COUNT(*) as purchase_count
+    FROM event_logs e
+    JOIN customer_segments cs ON e.customer_id = cs.customer_id
+    JOIN product_catalog p ON e.product_id = p.product_id
+    WHERE e.event_type = 'purchase'
+    GROUP BY cs.segment_tag, p.product_id
+    ORDER BY cs.segment_tag, purchase_count DESC, p.product_id
+"""
+
+# Materialized SEGMENT_POPULARITY_QUERY plus a one-row flag the triggers below set whenever
+# segments, purchases or the set of catalog products change
+SEGMENT_POPULARITY_DDL = """
+    CREATE TABLE IF NOT EXISTS segment_top_products (
+        segment_tag TEXT NOT NULL,
+        product_id TEXT NOT NULL,
+        purchase_count INTEGER NOT NULL,
+        rank INTEGER NOT NULL,  -- 1 = most purchased in the segment
+        PRIMARY KEY (segment_tag, product_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_segment_top_products_rank ON segment_top_products(segment_tag, rank);
+
+    CREATE TABLE IF NOT EXISTS segment_top_products_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        stale INTEGER NOT NULL DEFAULT 1,
+        refreshed_at DATETIME
+    );
+    INSERT OR IGNORE INTO segment_top_products_state (id, stale) VALUES (1, 1);
+
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_insert AFTER INSERT ON customer_segments
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_update AFTER UPDATE OF customer_id, segment_tag ON customer_segments
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_delete AFTER DELETE ON customer_segments
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_insert AFTER INSERT ON event_logs
+    WHEN NEW.event_type = 'purchase'
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_update AFTER UPDATE OF customer_id, product_id, event_type ON event_logs
+    WHEN OLD.event_type = 'purchase' OR NEW.event_type = 'purchase'
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_delete AFTER DELETE ON event_logs
+    WHEN OLD.event_type = 'purchase'
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_product_insert AFTER INSERT ON product_catalog
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+    CREATE TRIGGER IF NOT EXISTS segment_top_products_product_delete AFTER DELETE ON product_catalog
+    BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+"""
+
+SEGMENT_POPULARITY_TRIGGERS = re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", SEGMENT_POPULARITY_DDL)
+
+def ensure_segment_popularity(conn):
+    """
+    Create segment_top_products, its state row and invalidation triggers if any are missing.
+
+    Triggers go missing when a watched table is dropped and recreated (as /api/upload does),
+    and changes made meanwhile were not recorded, so recreating them also marks the table stale.
+    """
+    existing = {name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"
+    )}
+    if existing.issuperset(SEGMENT_POPULARITY_TRIGGERS) and 'segment_top_products_state' in existing:
+        return
+    conn.executescript(SEGMENT_POPULARITY_DDL)
+    conn.execute("UPDATE segment_top_products_state SET stale = 1 WHERE id = 1")
+    conn.commit()
+
+def invalidate_segment_popularity(conn):
+    """Mark segment_top_products stale, e.g. after replacing tables the triggers cannot see."""
+    ensure_segment_popularity(conn)
+    conn.execute("UPDATE segment_top_products_state SET stale = 1 WHERE id = 1")
+    conn.commit()
+
+def refresh_segment_popularity(conn, force=False):
+    """
+    Recompute segment_top_products if a trigger marked it stale (or `force` is set).
+
+    The staleness check and rebuild run in one write transaction, so concurrent
+    refreshes rebuild the table once and readers see either the old or the new rows.
+
+    Returns:
+        bool: Whether the table was rebuilt
+    """
+    ensure_segment_popularity(conn)
+    if not force and not conn.execute("SELECT stale FROM segment_top_products_state WHERE id = 1").fetchone()[0]:
+        return False
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if not force and not conn.execute("SELECT stale FROM segment_top_products_state WHERE id = 1").fetchone()[0]:
+            conn.rollback()
+            return False
+        conn.execute("DELETE FROM segment_top_products")
+        conn.execute(f"""
+            INSERT INTO segment_top_products (segment_tag, product_id, purchase_count, rank)
+            SELECT
+                segment_tag,
+                product_id,
+                purchase_count,
+                ROW_NUMBER() OVER (PARTITION BY segment_tag ORDER BY purchase_count DESC, product_id)
+            FROM ({SEGMENT_POPULARITY_QUERY})
+        """)
+        conn.execute("""
+            UPDATE segment_top_products_state
+            SET stale = 0, refreshed_at = CURRENT_TIMESTAMP
+            WHERE id = 1
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    rows = conn.execute("SELECT COUNT(*), COUNT(DISTINCT segment_tag) FROM segment_top_products").fetchone()
+    logger.info(f"Refreshed segment_top_products: {rows[0]} products across {rows[1]} segments")
+    return True
+
+def get_segment_top_products(conn, segment_tag=None, limit=None):
+    """
+    Most purchased products per segment, refreshing the materialized table first if it is stale.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        segment_tag (str): Only this segment; all segments when None
+        limit (int): Keep at most this many products per segment
+
+    Returns:
+        dict: segment tag -> {product ID: purchase count}, most purchased first
+    """
+    refresh_segment_popularity(conn)
+    query = "SELECT segment_tag, product_id, purchase_count FROM segment_top_products WHERE 1 = 1"
+    params = []
+    if segment_tag is not None:
+        query += " AND segment_tag = ?"
+        params.append(segment_tag)
+    if limit is not None:
+        query += " AND rank <= ?"
+        params.append(limit)
+    query += " ORDER BY segment_tag, rank"
+
+    segments = {}
+    for tag, product_id, purchase_count in conn.execute(query, params):
+        segments.setdefault(tag, {})[product_id] = purchase_count
+    return segments
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-segment product popularity')
+    parser.add_argument('--db', type=str,
+                      default=str(Path(__file__).parent.parent.absolute() / 'database' / 'data.db'),
+                      help='Path to the SQLite database')
+    parser.add_argument('--refresh', action='store_true', help='Rebuild the table even if it is not stale')
+    parser.add_argument('--limit', type=int, default=5, help='Products shown per segment')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.refresh:
+            refresh_segment_popularity(conn, force=True)
+        for segment_tag, products in get_segment_top_products(conn, limit=args.limit).items():
+            print(f"{segment_tag}: " + ", ".join(f"{product_id} ({count})" for product_id, count in products.items()))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
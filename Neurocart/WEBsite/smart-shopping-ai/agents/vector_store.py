@@ -0,0 +1,232 @@
+import os
+import json
+import uuid
+import argparse
+import logging
+from pathlib import Path
+import numpy as np
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DTYPES = ('float32', 'float16', 'int8')
+
+# Rows are dequantized in blocks of this size so scoring never materialises the full float32 matrix
+BLOCK_ROWS = 65536
+
+class VectorStore:
+    """
+    Compact storage for product embeddings.
+
+    Vectors are L2-normalised and kept in one contiguous matrix of float32, float16 or
+    int8 (with a per-row scale). On disk a store is three files sharing a prefix:
+    `<prefix>.<version>.npy` (the matrix, memory-mappable), `<prefix>.<version>.aux.npy`
+    (per-row scale and original norm) and `<prefix>.ids.json` (row -> product ID index and
+    the current version). Each save writes new versioned files and then swaps ids.json in
+    a single rename, so readers see either the old store or the new one, never a mix.
+    """
+
+    def __init__(self, ids, data, scales, norms):
+        self.ids = list(ids)
+        self.data = data
+        self.scales = scales
+        self.norms = norms
+        self.index = {product_id: row for row, product_id in enumerate(self.ids)}
+        self._id_rank = None
+
+    @property
+    def dtype(self):
+        return self.data.dtype.name
+
+    @property
+    def dim(self):
+        return self.data.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.scales.nbytes + self.norms.nbytes
+
+    @property
+    def id_rank(self):
+        """Position of each row's product ID in sorted ID order, the tie-breaker for equal scores."""
+        if self._id_rank is None:
+            order = np.argsort(np.array(self.ids, dtype=object), kind='stable')
+            self._id_rank = np.empty(len(order), dtype=np.int64)
+            self._id_rank[order] = np.arange(len(order))
+        return self._id_rank
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, product_id):
+        return product_id in self.index
+
+    @classmethod
+    def build(cls, ids, matrix, dtype='float32'):
+        """
+        Quantize a (n, dim) matrix of raw embeddings.
+
+        Args:
+            ids (list): Product IDs, one per row
+            matrix (array-like): Raw embedding vectors
+            dtype (str): One of 'float32', 'float16' or 'int8'
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}; expected one of {DTYPES}")
+
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("Embedding matrix must be 2-D with one row per product ID")
+
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        unit = matrix / np.where(norms > 0, norms, 1)[:, None]
+
+        if dtype == 'int8':
+            scales = np.abs(unit).max(axis=1) / 127.0
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            data = np.clip(np.rint(unit / scales[:, None]), -127, 127).astype(np.int8)
+        else:
+            scales = np.ones(len(unit), dtype=np.float32)
+            data = unit.astype(dtype)
+
+        return cls(ids, np.ascontiguousarray(data), scales, norms)
+
+    @staticmethod
+    def paths(prefix, version=None):
+        """Matrix, aux and ID index paths; stores saved before versioning have no version."""
+        prefix = str(prefix)
+        stem = f"{prefix}.{version}" if version else prefix
+        return Path(stem + '.npy'), Path(stem + '.aux.npy'), Path(prefix + '.ids.json')
+
+    @classmethod
+    def exists(cls, prefix):
+        return cls.paths(prefix)[2].exists()
+
+    def save(self, prefix):
+        version = uuid.uuid4().hex
+        data_path, aux_path, ids_path = self.paths(prefix, version)
+        os.makedirs(data_path.parent, exist_ok=True)
+
+        np.save(data_path, self.data)
+        np.save(aux_path, np.stack([self.scales, self.norms], axis=1))
+        tmp_ids = ids_path.with_name(ids_path.name + '.tmp')
+        with open(tmp_ids, 'w') as f:
+            json.dump({'version': version, 'dtype': self.dtype, 'dim': self.dim, 'ids': self.ids}, f)
+
+        # The ID index names the version, so replacing it is the one step that publishes the store
+        os.replace(tmp_ids, ids_path)
+        self._remove_old_versions(prefix, version)
+        logger.info(f"Saved {len(self)} {self.dtype} vectors ({self.nbytes / 1e6:.2f} MB) to {data_path}")
+
+    @classmethod
+    def _remove_old_versions(cls, prefix, version):
+        """Delete matrix and aux files of earlier saves (best effort: mapped files may be locked)."""
+        current = set(cls.paths(prefix, version)[:2])
+        base = Path(prefix)
+        for path in base.parent.glob(base.name + '.*npy'):
+            if path not in current:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    logger.warning(f"Could not remove old vector file {path}: {e}")
+
+    @classmethod
+    def load(cls, prefix, mmap=True, retries=3):
+        for attempt in range(retries):
+            with open(cls.paths(prefix)[2]) as f:
+                meta = json.load(f)
+            data_path, aux_path, _ = cls.paths(prefix, meta.get('version'))
+            try:
+                data = np.load(data_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+                aux = np.load(aux_path, allow_pickle=False)
+                break
+            except FileNotFoundError:
+                # A concurrent save published a new version and removed this one; re-read the index
+                if attempt == retries - 1:
+                    raise
+        if data.shape != (len(meta['ids']), meta['dim']) or aux.shape != (len(meta['ids']), 2) \
+                or data.dtype.name != meta['dtype']:
+            raise ValueError(f"Vector store at {prefix} is inconsistent: {data.shape} {data.dtype.name} "
+                             f"vectors and {aux.shape[0]} aux rows vs {len(meta['ids'])} {meta['dtype']} IDs")
+        return cls(meta['ids'], data, np.ascontiguousarray(aux[:, 0]), np.ascontiguousarray(aux[:, 1]))
+
+    def vectors(self, rows=None):
+        """Return dequantized unit vectors (float32) for the given rows, or all rows."""
+        data = self.data if rows is None else self.data[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        out = data.astype(np.float32)
+        if self.dtype == 'int8':
+            out *= scales[:, None]
+        return out
+
+    def vector(self, product_id):
+        return self.vectors([self.index[product_id]])[0]
+
+    def dot(self, query, rows=None):
+        """Dot product of `query` with the stored unit vectors (the given rows, or all rows block-wise)."""
+        return self.dot_many(np.asarray(query)[None, :], rows)[0]
+
+    def dot_many(self, queries, rows=None):
+        """
+        (len(queries), n) dot products of several queries with the given rows, or every row block-wise.
+
+        This is the one scoring kernel for single and batched queries: a BLAS product
+        accumulated in float64 and rounded once to float32. Summation order then never
+        changes the float32 result, so a product scores the same on every path and
+        identical vectors tie exactly wherever they sit in a block.
+        """
+        queries = np.asarray(queries, dtype=np.float64)
+        if rows is not None:
+            scores = queries @ self.data[rows].astype(np.float64).T
+            if self.dtype == 'int8':
+                scores *= self.scales[rows]
+            return scores.astype(np.float32)
+
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.data[start:start + BLOCK_ROWS]
+            block_scores = queries @ block.astype(np.float64).T
+            if self.dtype == 'int8':
+                block_scores *= self.scales[start:start + len(block)]
+            scores[:, start:start + len(block)] = block_scores
+        return scores
+
+    def similarity(self, query):
+        """Cosine similarity of every stored vector with `query`, computed block-wise on the quantized data."""
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        return self.dot(query / norm)
+
+    def top_k(self, query, k=10, exclude=()):
+        """Return [(product_id, similarity)] for the k most similar products."""
+        scores = self.similarity(query)
+        for product_id in exclude:
+            row = self.index.get(product_id)
+            if row is not None:
+                scores[row] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        top = np.flatnonzero(scores >= kth)
+        top = top[np.lexsort((self.id_rank[top], -scores[top]))][:k]
+        return [(self.ids[row], float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect a product vector store')
+    parser.add_argument('--prefix', type=str,
+                      default=str(Path(__file__).parent.parent.absolute() / 'embeddings' / 'product_vectors'),
+                      help='Vector store path prefix (without .npy)')
+    args = parser.parse_args()
+
+    store = VectorStore.load(args.prefix)
+    print(f"{len(store)} vectors, dim={store.dim}, dtype={store.dtype}, {store.nbytes / 1e6:.2f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import os
 import json
 import sqlite3
-import pandas as pd
 from pathlib import Path
 import logging
 from flask import Flask, request, jsonify, render_template, send_from_directory
@@ -11,6 +10,9 @@ from werkzeug.utils import secure_filename
 # Import agents
 from agents.recommendation_engine import RecommendationEngine
 from agents.reporter import InsightsReporter
+from agents.customer_loader import CustomerLoaderAgent
+from agents.columnar import read_frame, table_column_types
+from agents.segment_popularity import get_segment_top_products, invalidate_segment_popularity
 
 # Configure logging
 logging.basicConfig(
@@ -29,7 +31,7 @@ app = Flask(__name__)
 PROJECT_ROOT = Path(__file__).parent.absolute()
 DB_PATH = PROJECT_ROOT / 'database' / 'data.db'
 UPLOAD_FOLDER = PROJECT_ROOT / "data"
-ALLOWED_EXTENSIONS = {'csv'}
+ALLOWED_EXTENSIONS = {'csv', 'parquet', 'pq', 'arrow', 'feather', 'ipc'}
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -104,8 +106,8 @@ def upload_files():
         products_file = request.files['products']
         events_file = request.files.get('events')
         
-        if not all(allowed_file(f.filename) for f in [customers_file, products_file] if f):
-            return jsonify({'error': 'Invalid file type. Only CSV files are allowed.'}), 400
+        if not all(allowed_file(f.filename) for f in [customers_file, products_file, events_file] if f):
+            return jsonify({'error': 'Invalid file type. Only CSV, Parquet and Arrow files are allowed.'}), 400
             
         # Save files
         customers_path = UPLOAD_FOLDER / secure_filename(customers_file.filename)
@@ -123,21 +125,28 @@ def upload_files():
         cursor = conn.cursor()
         
         # Load customers data
-        customers_df = pd.read_csv(customers_path)
+        customers_df = read_frame(customers_path, table_column_types(cursor, 'customer_sessions'))
         customers_df.to_sql('customer_sessions', conn, if_exists='replace', index=False)
         
         # Load products data
-        products_df = pd.read_csv(products_path)
+        products_df = read_frame(products_path, table_column_types(cursor, 'product_catalog'))
         products_df.to_sql('product_catalog', conn, if_exists='replace', index=False)
         
-        # Load events data if provided
-        if events_file:
-            events_df = pd.read_csv(events_path)
-            events_df.to_sql('event_logs', conn, if_exists='replace', index=False)
-            
         conn.commit()
+        
+        # Replacing product_catalog dropped its invalidation triggers; recreate them and rebuild on next read
+        invalidate_segment_popularity(conn)
         conn.close()
         
+        # Append events incrementally: re-uploading a file only adds the rows it gained since last time
+        if events_file:
+            loader = CustomerLoaderAgent(customers_path)
+            loader.connect_db()
+            try:
+                loader.load_event_logs(events_path)
+            finally:
+                loader.conn.close()
+        
         return jsonify({
             'status': 'success',
             'message': 'Files uploaded and processed successfully'
@@ -266,6 +275,42 @@ def get_segments():
         logger.error(f"Error getting segments: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/segments/<segment_tag>/top_products', methods=['GET'])
+def get_segment_products(segment_tag):
+    """Get the most purchased products in a segment."""
+    try:
+        limit = request.args.get('limit', 10, type=int)
+        conn = get_db_connection()
+        
+        # Served from the materialized segment_top_products table, refreshed only when stale
+        products = get_segment_top_products(conn, segment_tag, limit).get(segment_tag, {})
+        
+        details = {}
+        if products:
+            placeholders = ','.join('?' * len(products))
+            cursor = conn.execute(f'''
+                SELECT product_id, name, price, category
+                FROM product_catalog
+                WHERE product_id IN ({placeholders})
+            ''', list(products))
+            details = {row['product_id']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        
+        return jsonify({
+            'segment_tag': segment_tag,
+            'products': [
+                {
+                    'product': details.get(product_id, {'product_id': product_id}),
+                    'purchase_count': purchase_count
+                }
+                for product_id, purchase_count in products.items()
+            ]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting segment products: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/reports/latest', methods=['GET'])
 def get_latest_report():
     """Get the latest insights report."""
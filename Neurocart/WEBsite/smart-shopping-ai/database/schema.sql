@@ -7,6 +7,9 @@ DROP TABLE IF EXISTS product_embeddings;
 DROP TABLE IF EXISTS recommendation_results;
 DROP TABLE IF EXISTS optimization_summary;
 DROP TABLE IF EXISTS reports;
+DROP TABLE IF EXISTS ingestion_watermarks;
+DROP TABLE IF EXISTS segment_top_products;
+DROP TABLE IF EXISTS segment_top_products_state;
 
 -- Create customer_sessions table
 CREATE TABLE IF NOT EXISTS customer_sessions (
@@ -27,6 +30,7 @@ CREATE TABLE IF NOT EXISTS event_logs (
     event_type TEXT,  -- view, click, add_to_cart, purchase
     timestamp DATETIME,
     dwell_time INTEGER,  -- in seconds
+    source_file TEXT,  -- file the row was loaded from (ingestion_watermarks.source)
     FOREIGN KEY (customer_id) REFERENCES customer_sessions(customer_id),
     FOREIGN KEY (product_id) REFERENCES product_catalog(product_id)
 );
@@ -53,7 +57,9 @@ CREATE TABLE IF NOT EXISTS product_catalog (
 -- Create product_embeddings table
 CREATE TABLE IF NOT EXISTS product_embeddings (
     product_id TEXT PRIMARY KEY,
-    vector_blob BLOB,  -- Binary vector data
+    vector_blob BLOB,  -- Unused: vectors are kept in embeddings/product_vectors.npy
+    content_hash TEXT,  -- SHA-256 of the embedded text (name + description)
+    model_id TEXT,  -- Embedding model that produced the vector
     FOREIGN KEY (product_id) REFERENCES product_catalog(product_id)
 );
 
@@ -82,10 +88,60 @@ CREATE TABLE IF NOT EXISTS reports (
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create ingestion_watermarks table (incremental CSV loads, one row per source file)
+CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+    source TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,  -- sha256 of the file's first fingerprint_bytes bytes (rows for Parquet/Arrow)
+    fingerprint_bytes INTEGER NOT NULL,
+    byte_offset INTEGER NOT NULL,  -- end of the last loaded row
+    rows_loaded INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create segment_top_products table (materialized per-segment purchase counts, see agents/segment_popularity.py)
+CREATE TABLE IF NOT EXISTS segment_top_products (
+    segment_tag TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    purchase_count INTEGER NOT NULL,
+    rank INTEGER NOT NULL,  -- 1 = most purchased in the segment
+    PRIMARY KEY (segment_tag, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_top_products_rank ON segment_top_products(segment_tag, rank);
+
+CREATE TABLE IF NOT EXISTS segment_top_products_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    stale INTEGER NOT NULL DEFAULT 1,
+    refreshed_at DATETIME
+);
+INSERT OR IGNORE INTO segment_top_products_state (id, stale) VALUES (1, 1);
+
+CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_insert AFTER INSERT ON customer_segments
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_update AFTER UPDATE OF customer_id, segment_tag ON customer_segments
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+CREATE TRIGGER IF NOT EXISTS segment_top_products_segment_delete AFTER DELETE ON customer_segments
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+
+CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_insert AFTER INSERT ON event_logs
+WHEN NEW.event_type = 'purchase'
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_update AFTER UPDATE OF customer_id, product_id, event_type ON event_logs
+WHEN OLD.event_type = 'purchase' OR NEW.event_type = 'purchase'
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+CREATE TRIGGER IF NOT EXISTS segment_top_products_purchase_delete AFTER DELETE ON event_logs
+WHEN OLD.event_type = 'purchase'
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+
+CREATE TRIGGER IF NOT EXISTS segment_top_products_product_insert AFTER INSERT ON product_catalog
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+CREATE TRIGGER IF NOT EXISTS segment_top_products_product_delete AFTER DELETE ON product_catalog
+BEGIN UPDATE segment_top_products_state SET stale = 1 WHERE stale = 0; END;
+
 -- Create indexes for better performance
 CREATE INDEX idx_event_logs_customer ON event_logs(customer_id);
 CREATE INDEX idx_event_logs_session ON event_logs(customer_id);
 CREATE INDEX idx_event_logs_product ON event_logs(product_id);
+CREATE INDEX idx_event_logs_source_file ON event_logs(source_file);
 CREATE INDEX idx_customer_segments_tag ON customer_segments(segment_tag);
 CREATE INDEX idx_product_catalog_category ON product_catalog(category);
 CREATE INDEX idx_recommendation_results_customer ON recommendation_results(customer_id);
@@ -34,7 +34,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class SmartShoppingAI:
-    def __init__(self):
+    def __init__(self, workers=1):
         # Get the absolute path to the project root
         self.project_root = Path(__file__).parent.absolute()
         
@@ -42,6 +42,9 @@ class SmartShoppingAI:
         self.data_dir = self.project_root / 'data'
         self.db_path = self.project_root / 'database' / 'data.db'
         
+        # Processes used by the generate_recommendations step
+        self.workers = workers
+        
         # Ensure directories exist
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.project_root / 'database', exist_ok=True)
@@ -97,7 +100,9 @@ class SmartShoppingAI:
         try:
             products_file = self.data_dir / 'products.csv'
             self.product_catalog = ProductCatalogAgent(str(products_file))
-            self.product_catalog.run()
+            changes = self.product_catalog.run()
+            if changes:
+                logger.info("Catalog changes: " + ", ".join(f"{len(ids)} {kind}" for kind, ids in changes.items()))
             logger.info("Product catalog processed successfully")
             return True
         except Exception as e:
@@ -107,7 +112,7 @@ class SmartShoppingAI:
     def generate_recommendations(self):
         """Generate personalized product recommendations."""
         try:
-            self.recommendation_engine = RecommendationEngine()
+            self.recommendation_engine = RecommendationEngine(workers=self.workers)
             self.recommendation_engine.run()
             logger.info("Recommendations generated successfully")
             return True
@@ -187,10 +192,12 @@ def main():
                                'process_products', 'generate_recommendations', 
                                'optimize_shopping', 'generate_reports'],
                       help='Specific steps to run. If not provided, all steps will run.')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Worker processes for generate_recommendations (default: 1)')
     
     args = parser.parse_args()
     
-    app = SmartShoppingAI()
+    app = SmartShoppingAI(workers=args.workers)
     results = app.run_pipeline(args.steps)
     
     # Print summary
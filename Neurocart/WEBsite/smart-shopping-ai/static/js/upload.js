@@ -53,12 +53,13 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     
     // Add file validation
+    const allowedExtensions = ['.csv', '.parquet', '.pq', '.arrow', '.feather', '.ipc'];
     const fileInputs = document.querySelectorAll('input[type="file"]');
     fileInputs.forEach(input => {
         input.addEventListener('change', (e) => {
             const file = e.target.files[0];
-            if (file && !file.name.endsWith('.csv')) {
-                alert('Please upload a CSV file');
+            if (file && !allowedExtensions.some(ext => file.name.toLowerCase().endsWith(ext))) {
+                alert('Please upload a CSV, Parquet or Arrow file');
                 e.target.value = '';
             }
         });
@@ -0,0 +1,53 @@
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+@lru_cache(maxsize=200000)
+def _feature(token, dim):
+    h = zlib.crc32(token.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+class HashingBackend:
+    """In-process lexical embeddings via signed feature hashing, shared by the bot and the web app.
+
+    Each text is tokenised into lowercase words plus character trigrams of each word,
+    hashed into `dim` buckets with a stable CRC32 and L2-normalised. No model server,
+    no fitting, and vectors are identical across processes, runs and both apps, so the
+    same model id always means the same vectors.
+    """
+
+    cacheable = False
+
+    def __init__(self, dim=512, ngram=3, ngram_weight=0.5):
+        self.dim = dim
+        self.ngram = ngram
+        self.ngram_weight = ngram_weight
+        self.name = f"hashing-crc32-{dim}"
+        self.model_id = self.name
+
+    def _features(self, text):
+        for word in TOKEN_RE.findall(text.lower()):
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                yield padded[i:i + self.ngram], self.ngram_weight
+
+    def embed_many(self, texts):
+        """Embed a list of texts into a (len(texts), dim) float32 matrix of unit rows."""
+        texts = [str(text) for text in texts]
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vector = matrix[row]
+            for token, weight in self._features(text):
+                index, sign = _feature(token, self.dim)
+                vector[index] += sign * weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1)
+        return matrix
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
@@ -1,23 +1,60 @@
-import sqlite3
 import json
 import os
+import sys
+import threading
+from collections import OrderedDict
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.connection_pool import get_pool
+from instrumentation import instrumentation
 
 class CustomerAgent:
-    def __init__(self, db_path=os.path.join(os.path.dirname(__file__), '..', 'db', 'ecommerce.db')):
+    def __init__(self, db_path=os.path.join(os.path.dirname(__file__), '..', 'db', 'ecommerce.db'),
+                 cache_size=10000):
         self.db_path = os.path.abspath(db_path)
         if not os.path.exists(self.db_path):
             raise FileNotFoundError(f"Database file not found at: {self.db_path}")
+        self.pool = get_pool(self.db_path)
+        # Decoded profiles, dropped wholesale whenever the database's data_version changes.
+        self.cache_size = cache_size
+        self._profiles = OrderedDict()
+        self._data_version = None
+        self._lock = threading.Lock()
+
+    def _check_data_version(self):
+        version = self.pool.data_version()
+        if version != self._data_version:
+            self._profiles.clear()
+            self._data_version = version
+
+    def customer_exists(self, customer_id):
+        with self._lock:
+            self._check_data_version()
+            if customer_id in self._profiles:
+                return True
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT 1 FROM customers WHERE Customer_ID = ?", (customer_id,)).fetchone()
+        instrumentation.count("db.queries")
+        return row is not None
 
     def get_customer_profile(self, customer_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM customers WHERE Customer_ID = ?", (customer_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with self._lock:
+            self._check_data_version()
+            profile = self._profiles.get(customer_id)
+            if profile is not None:
+                self._profiles.move_to_end(customer_id)
+                instrumentation.count("profile_cache.hits")
+                return dict(profile)
+        instrumentation.count("profile_cache.misses")
+
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM customers WHERE Customer_ID = ?", (customer_id,)).fetchone()
+        instrumentation.count("db.queries")
 
         if not row:
             raise ValueError(f"Customer {customer_id} not found!")
-        
+        instrumentation.count("db.customer_rows")
+
         columns = ["Customer_ID", "Age", "Gender", "Location", "Browsing_History", 
                    "Purchase_History", "Customer_Segment", "Avg_Order_Value", "Holiday", "Season"]
         customer = dict(zip(columns, row))
@@ -33,7 +70,13 @@ class CustomerAgent:
             "holiday": customer["Holiday"] == "Yes",
             "location": customer["Location"]
         }
-        return profile
+
+        with self._lock:
+            self._profiles[customer_id] = profile
+            self._profiles.move_to_end(customer_id)
+            while len(self._profiles) > self.cache_size:
+                self._profiles.popitem(last=False)
+        return dict(profile)
 
 if __name__ == "__main__":
     agent = CustomerAgent()
@@ -41,4 +84,4 @@ if __name__ == "__main__":
         profile = agent.get_customer_profile("C1000")
         print("Customer Profile:", profile)
     except Exception as e:
-        print(f"Error: {e}")
\ No newline at end of file
+        print(f"Error: {e}")
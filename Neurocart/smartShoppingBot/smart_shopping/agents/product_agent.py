@@ -1,40 +1,51 @@
-import sqlite3
 import json
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from agents.customer_agent import CustomerAgent
+from db.sqlite_db import missing_indexes
+from db.connection_pool import get_pool
+from instrumentation import instrumentation
+
+PRODUCT_COLUMNS = ["Product_ID", "Category", "Subcategory", "Price", "Brand", "Average_Rating_of_Similar_Products",
+                   "Product_Rating", "Customer_Review_Sentiment_Score", "Holiday", "Season", "Geographical_Location",
+                   "Similar_Product_List", "Probability_of_Recommendation"]
 
 class ProductAgent:
     def __init__(self, db_path=os.path.join(os.path.dirname(__file__), '..', 'db', 'ecommerce.db')):
         self.db_path = os.path.abspath(db_path)
         if not os.path.exists(self.db_path):
             raise FileNotFoundError(f"Database file not found at: {self.db_path}")
+        self.pool = get_pool(self.db_path)
+        # Embedding_ID only exists once db/sqlite_db.py has precomputed category embeddings.
+        with self.pool.connection() as conn:
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+            # Databases built before an index existed need `python db/sqlite_db.py --migrate`.
+            missing = missing_indexes(conn)
+        if missing:
+            print(f"Warning: {self.db_path} is missing index(es) {', '.join(missing)}; "
+                  f"run `python db/sqlite_db.py --migrate` to add them.")
+        self.columns = PRODUCT_COLUMNS + (["Embedding_ID"] if "Embedding_ID" in existing else [])
 
     def get_products(self, customer_profile):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM products")
-        rows = cursor.fetchall()
-        conn.close()
-
-        if not rows:
+        preferences = list(dict.fromkeys(customer_profile["preferences"]))
+        if not preferences:
             return []
 
-        columns = ["Product_ID", "Category", "Subcategory", "Price", "Brand", "Average_Rating_of_Similar_Products",
-                   "Product_Rating", "Customer_Review_Sentiment_Score", "Holiday", "Season", "Geographical_Location",
-                   "Similar_Product_List", "Probability_of_Recommendation"]
-        products = [dict(zip(columns, row)) for row in rows]
+        # Stricter filtering: Must match preferences AND budget
+        placeholders = ",".join("?" * len(preferences))
+        query = (f"SELECT {', '.join(self.columns)} FROM products "
+                 f"WHERE Category IN ({placeholders}) AND Price <= ?")
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, (*preferences, customer_profile["budget"] * 1.5)).fetchall()
+        instrumentation.count("db.queries")
+        instrumentation.count("db.product_rows", len(rows))
+
+        products = [dict(zip(self.columns, row)) for row in rows]
         for p in products:
             p["Similar_Product_List"] = json.loads(p["Similar_Product_List"])
-
-        # Stricter filtering: Must match preferences AND budget
-        filtered = [p for p in products if p["Category"] in customer_profile["preferences"] and 
-                    p["Price"] <= customer_profile["budget"] * 1.5]
-        
-        # Limit to 100 products to avoid overloading RecommendationAgent
-        return filtered[:100]
+        return products
 
 if __name__ == "__main__":
     ca = CustomerAgent()
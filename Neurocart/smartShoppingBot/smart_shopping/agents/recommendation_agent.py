@@ -1,52 +1,130 @@
 import sys
 import os
+import numpy as np
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from models.embedding_model import EmbeddingModel
 from agents.customer_agent import CustomerAgent
 from agents.product_agent import ProductAgent
+from db.connection_pool import get_pool
+from instrumentation import instrumentation
 
 class RecommendationAgent:
-    def __init__(self):
-        self.embedding_model = EmbeddingModel()
+    def __init__(self, db_path=os.path.join(os.path.dirname(__file__), '..', 'db', 'ecommerce.db'), verbose=True,
+                 embedding_model=None):
+        self.db_path = os.path.abspath(db_path)
+        # Batch and server modes pass verbose=False to skip the per-request progress output.
+        self.log = print if verbose else (lambda *args, **kwargs: None)
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.load_category_embeddings()
+
+    def load_category_embeddings(self):
+        """Load the precomputed category_embeddings table, if present, for this model."""
+        self.category_index = {}
+        self.category_rows = {}
+        self.category_matrix = np.empty((0, 0), dtype=np.float32)
+        if not os.path.exists(self.db_path):
+            return
+        with get_pool(self.db_path).connection() as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'category_embeddings'").fetchone():
+                return
+            rows = conn.execute("SELECT Embedding_ID, Category, Subcategory, Dim, Vector FROM category_embeddings WHERE Model = ? "
+                                "ORDER BY Embedding_ID", (self.embedding_model.model,)).fetchall()
+        if rows:
+            self.category_matrix = np.vstack([np.frombuffer(vector, dtype=np.float32, count=dim)
+                                              for _, _, _, dim, vector in rows])
+            self.category_index = {embedding_id: i for i, (embedding_id, *_) in enumerate(rows)}
+            # Preferences name categories or subcategories; map either to its vectors.
+            for i, (_, category, subcategory, _, _) in enumerate(rows):
+                self.category_rows.setdefault(category, []).append(i)
+                if subcategory != category:
+                    self.category_rows.setdefault(subcategory, []).append(i)
+        self.log(f"Loaded {len(self.category_index)} precomputed category embeddings.")
+
+    def embed_products(self, product_list):
+        """Look up precomputed category vectors, embedding only products without one."""
+        rows = np.array([self.category_index.get(p.get("Embedding_ID"), -1) for p in product_list], dtype=np.intp)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing) == 0:
+            return self.category_matrix[rows]
+
+        fresh = self.embedding_model.embed_many(
+            f"{product_list[i]['Category']} {product_list[i]['Subcategory']}" for i in missing)
+        if len(missing) == len(product_list):
+            return fresh
+        matrix = np.empty((len(product_list), fresh.shape[1]), dtype=np.float32)
+        found = np.flatnonzero(rows >= 0)
+        matrix[found] = self.category_matrix[rows[found]]
+        matrix[missing] = fresh
+        return matrix
+
+    def embed_preferences(self, preferences):
+        """Normalised mean of the precomputed vectors of the preferred categories and subcategories.
+
+        Falls back to embedding the preference text only when some preferred category has
+        no precomputed vector, so a database built with --precompute-embeddings never needs
+        the model server to score.
+        """
+        rows = [self.category_rows.get(category) for category in preferences]
+        if rows and all(rows):
+            vectors = self.category_matrix[[i for category_rows in rows for i in category_rows]]
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            mean = vectors.mean(axis=0)
+            return mean / max(np.linalg.norm(mean), 1e-12)
+        # Sorted so the same preferences always produce the same (cacheable) text.
+        pref_text = " ".join(sorted(preferences))
+        self.log(f"Preferences text: {pref_text}")
+        return np.asarray(self.embedding_model.embed(pref_text), dtype=np.float32)
+
+    def recommend(self, customer_profile, product_list, top_k=3):
+        self.log(f"Received {len(product_list)} products to recommend from.")
+        if not product_list:
+            self.log("No scores generated!")
+            return []
 
-    def recommend(self, customer_profile, product_list):
-        print(f"Received {len(product_list)} products to recommend from.")
-        pref_text = " ".join(customer_profile["preferences"])
-        print(f"Preferences text: {pref_text}")
         try:
-            pref_embedding = self.embedding_model.embed(pref_text)
-            print("Generated preference embedding.")
+            with instrumentation.stage("recommend.embed_preferences"):
+                pref_embedding = self.embed_preferences(sorted(set(customer_profile["preferences"])))
+            self.log("Generated preference embedding.")
         except Exception as e:
-            print(f"Error generating preference embedding: {e}")
+            self.log(f"Error generating preference embedding: {e}")
             return []
 
-        product_scores = []
-        for i, product in enumerate(product_list):
-            prod_text = f"{product['Category']} {product['Subcategory']}"
-            try:
-                prod_embedding = self.embedding_model.embed(prod_text)
-                similarity = self.embedding_model.cosine_similarity(pref_embedding, prod_embedding)
-                score = (0.4 * similarity + 
-                         0.3 * product["Probability_of_Recommendation"] +
-                         0.2 * product["Customer_Review_Sentiment_Score"] +
-                         0.1 * (1 - abs(product["Price"] - customer_profile["budget"]) / customer_profile["budget"]))
-                product_scores.append((product, score))
-                if i % 1000 == 0:  # Progress update
-                    print(f"Scored {i+1} products...")
-            except Exception as e:
-                print(f"Error scoring product {product['Product_ID']}: {e}")
-                continue
-
-        print(f"Scored {len(product_scores)} products total.")
-        if not product_scores:
-            print("No scores generated!")
+        try:
+            with instrumentation.stage("recommend.embed_products"):
+                prod_embeddings = self.embed_products(product_list)
+        except Exception as e:
+            self.log(f"Error generating product embeddings: {e}")
+            return []
+
+        with instrumentation.stage("recommend.score"):
+            # Columnar blend of similarity, model probability, sentiment and budget distance.
+            budget = customer_profile["budget"]
+            probability = np.array([p["Probability_of_Recommendation"] for p in product_list], dtype=np.float64)
+            sentiment = np.array([p["Customer_Review_Sentiment_Score"] for p in product_list], dtype=np.float64)
+            price = np.array([p["Price"] for p in product_list], dtype=np.float64)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                norms = np.linalg.norm(prod_embeddings, axis=1) * np.linalg.norm(pref_embedding)
+                similarity = (prod_embeddings @ pref_embedding) / norms
+                scores = (0.4 * similarity +
+                          0.3 * probability +
+                          0.2 * sentiment +
+                          0.1 * (1 - np.abs(price - budget) / budget))
+
+        valid = np.flatnonzero(np.isfinite(scores))
+        instrumentation.count("recommend.products_scored", len(valid))
+        self.log(f"Scored {len(valid)} products total.")
+        if len(valid) == 0:
+            self.log("No scores generated!")
             return []
 
-        sorted_recs = sorted(product_scores, key=lambda x: x[1], reverse=True)
-        top_3 = sorted_recs[:3]
-        print(f"Returning top {len(top_3)} recommendations.")
-        return top_3
+        k = min(top_k, len(valid))
+        top = valid[np.argpartition(-scores[valid], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top_recs = [(product_list[i], float(scores[i])) for i in top]
+        self.log(f"Returning top {len(top_recs)} recommendations.")
+        return top_recs
 
 if __name__ == "__main__":
     ca = CustomerAgent()
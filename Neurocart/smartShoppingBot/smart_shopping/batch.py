@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+
+from agents.customer_agent import CustomerAgent
+from agents.product_agent import ProductAgent
+from agents.recommendation_agent import RecommendationAgent
+from instrumentation import instrumentation
+
+# Summary stage -> the instrumentation stage that times it in _process_shard.
+STAGES = {"profile": "profile_load", "products": "product_fetch", "recommend": "recommend"}
+CSV_FIELDS = ["customer_id", "rank", "product_id", "subcategory", "price", "score", "error"]
+
+_agents = None
+
+def _init_worker():
+    """Build one set of agents per worker process."""
+    global _agents
+    # Always on in workers: the batch summary's stage timings come from these snapshots.
+    instrumentation.enable()
+    _agents = (CustomerAgent(), ProductAgent(), RecommendationAgent(verbose=False))
+
+def _process_shard(customer_ids):
+    ca, pa, ra = _agents
+    # Each shard reports only its own instrumentation, which the parent merges.
+    instrumentation.reset()
+    results = []
+    for customer_id in customer_ids:
+        result = {"customer_id": customer_id, "recommendations": []}
+        try:
+            with instrumentation.stage("profile_load"):
+                profile = ca.get_customer_profile(customer_id)
+            with instrumentation.stage("product_fetch"):
+                products = pa.get_products(profile)
+            with instrumentation.stage("recommend"):
+                recommendations = ra.recommend(profile, products) if products else []
+            result["recommendations"] = [
+                {"product_id": product["Product_ID"], "subcategory": product["Subcategory"],
+                 "price": product["Price"], "score": score}
+                for product, score in recommendations
+            ]
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+    return results, instrumentation.snapshot()
+
+def read_customer_ids(path):
+    with open(path) as f:
+        ids = [line.strip() for line in f]
+    return [customer_id for customer_id in ids if customer_id and customer_id != "Customer_ID"]
+
+def all_customer_ids(customer_agent):
+    with customer_agent.pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT Customer_ID FROM customers ORDER BY Customer_ID")]
+
+class ResultWriter:
+    """Streams batch results to JSONL, or to CSV (one row per recommendation) for .csv paths."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", newline="")
+        self.csv = None
+        if path.lower().endswith(".csv"):
+            self.csv = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, result):
+        if self.csv is None:
+            self.file.write(json.dumps(result) + "\n")
+            return
+        if not result["recommendations"]:
+            self.csv.writerow({"customer_id": result["customer_id"], "error": result.get("error", "")})
+        for rank, rec in enumerate(result["recommendations"], start=1):
+            self.csv.writerow({"customer_id": result["customer_id"], "rank": rank, **rec})
+
+    def close(self):
+        self.file.close()
+
+def run_batch(customer_ids, output_path, workers=None, shard_size=100, profile=False):
+    workers = workers or os.cpu_count() or 1
+    shards = [customer_ids[i:i + shard_size] for i in range(0, len(customer_ids), shard_size)]
+    print(f"Processing {len(customer_ids)} customers in {len(shards)} shards across {workers} workers...")
+
+    totals = dict.fromkeys(STAGES, 0.0)
+    completed = failed = 0
+    writer = ResultWriter(output_path)
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(_process_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                results, snapshot = future.result()
+                if profile:
+                    instrumentation.merge(snapshot)
+                for result in results:
+                    writer.write(result)
+                    failed += "error" in result
+                completed += len(results)
+                for stage, name in STAGES.items():
+                    totals[stage] += snapshot["stages"].get(name, {}).get("seconds", 0.0)
+                print(f"Completed {completed}/{len(customer_ids)} customers...")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "customers": completed,
+        "failed": failed,
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "customers_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        # Stage times are summed across workers, so they can exceed the wall-clock total.
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in totals.items()},
+        "stage_ms_per_customer": {stage: round(1000 * seconds / completed, 3) if completed else 0.0
+                                  for stage, seconds in totals.items()},
+    }
+    print(f"\nWrote results to {output_path}")
+    print(json.dumps(summary, indent=2))
+    return summary
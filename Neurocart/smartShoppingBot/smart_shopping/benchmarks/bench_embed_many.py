@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.stub_embedding_server import start_stub_server
+from models.embedding_model import EmbeddingModel
+
+
+def run(n_texts=500, n_unique=200, latency=0.05, dim=2048, workers=(1, 4, 8, 16)):
+    server, url = start_stub_server(dim=dim, latency=latency)
+    texts = [f"Category {i % n_unique} Subcategory {i % n_unique}" for i in range(n_texts)]
+    print(f"{n_texts} texts ({n_unique} unique), {latency * 1000:.0f}ms simulated latency, dim={dim}")
+
+    try:
+        baseline = EmbeddingModel(cache=None, host=url, backend="ollama")
+        start = time.perf_counter()
+        for text in texts[:n_unique]:
+            baseline.embed(text)
+        elapsed = time.perf_counter() - start
+        print(f"serial embed():       {n_unique / elapsed:10.1f} unique texts/sec")
+
+        for max_workers in workers:
+            model = EmbeddingModel(cache=None, host=url, max_workers=max_workers, backend="ollama")
+            server.requests = 0
+            start = time.perf_counter()
+            matrix = model.embed_many(texts)
+            elapsed = time.perf_counter() - start
+            assert matrix.shape == (n_texts, dim)
+            print(f"embed_many(workers={max_workers:>2}): {n_texts / elapsed:10.1f} texts/sec "
+                  f"({server.requests} requests)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure EmbeddingModel.embed_many throughput against a stub server")
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--unique", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--dim", type=int, default=2048)
+    args = parser.parse_args()
+    run(args.texts, args.unique, args.latency, args.dim)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db.sqlite_db import (PRODUCT_COLUMNS, CUSTOMER_COLUMNS, PRODUCTS_DDL, CUSTOMERS_DDL,
+                          create_indexes, build_category_embeddings)
+from agents.customer_agent import CustomerAgent
+from agents.product_agent import ProductAgent
+from agents.recommendation_agent import RecommendationAgent
+from models.embedding_model import EmbeddingModel
+
+# Same category tree and value sets as the shipped products.csv / customers.csv.
+CATALOG = {
+    "Beauty": ["Foundation", "Lipstick", "Moisturizer", "Perfume"],
+    "Books": ["Biography", "Comics", "Fiction", "Non-fiction"],
+    "Electronics": ["Headphones", "Laptop", "Smartphone", "Smartwatch"],
+    "Fashion": ["Jacket", "Jeans", "Shoes", "T-shirt"],
+    "Fitness": ["Dumbbells", "Resistance Bands", "Treadmill", "Yoga Mat"],
+    "Home Decor": ["Cushions", "Curtains", "Lamp", "Wall Art"],
+}
+BRANDS = ["Brand A", "Brand B", "Brand C", "Brand D"]
+SEASONS = ["Autumn", "Spring", "Summer", "Winter"]
+COUNTRIES = ["Canada", "Germany", "India", "UK", "USA"]
+CITIES = ["Bangalore", "Chennai", "Delhi", "Kolkata", "Mumbai"]
+GENDERS = ["Female", "Male", "Other"]
+SEGMENTS = ["Frequent Buyer", "New Visitor", "Occasional Shopper"]
+YES_NO = ["No", "Yes"]
+
+DEFAULT_SCALES = [10000, 100000, 1000000]
+
+class StubBackend:
+    """Deterministic in-process embedder so the benchmark measures the pipeline, not a model server."""
+
+    cacheable = False
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"stub-{dim}"
+
+    def embed(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def embed_batch(self, texts):
+        return np.vstack([self.embed(text) for text in texts]) if texts else np.empty((0, self.dim), np.float32)
+
+def _pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+def _product_rows(rng, start, n):
+    categories = list(CATALOG)
+    cat = rng.integers(0, len(categories), n)
+    sub = rng.integers(0, 4, n)
+    n_similar = rng.integers(1, 4, n)
+    similar = rng.integers(0, 4, (n, 3))
+    columns = [
+        [f"P{i}" for i in range(start, start + n)],
+        [categories[c] for c in cat],
+        [CATALOG[categories[c]][s] for c, s in zip(cat, sub)],
+        rng.integers(100, 5001, n).astype(float).tolist(),
+        _pick(rng, BRANDS, n).tolist(),
+        np.round(rng.uniform(2, 5, n), 1).tolist(),
+        np.round(rng.uniform(2, 5, n), 1).tolist(),
+        np.round(rng.uniform(0, 1, n), 2).tolist(),
+        _pick(rng, YES_NO, n).tolist(),
+        _pick(rng, SEASONS, n).tolist(),
+        _pick(rng, COUNTRIES, n).tolist(),
+        [json.dumps([CATALOG[categories[c]][s] for s in row[:k]]) for c, row, k in zip(cat, similar, n_similar)],
+        np.round(rng.uniform(0.1, 1, n), 2).tolist(),
+    ]
+    return zip(*columns)
+
+def _customer_rows(rng, start, n):
+    categories = list(CATALOG)
+    n_interests = rng.integers(1, 4, n)
+    browsed = [rng.choice(len(categories), k, replace=False) for k in n_interests]
+    columns = [
+        [f"C{i}" for i in range(start, start + n)],
+        rng.integers(18, 61, n).tolist(),
+        _pick(rng, GENDERS, n).tolist(),
+        _pick(rng, CITIES, n).tolist(),
+        [json.dumps([categories[c] for c in cats]) for cats in browsed],
+        # One purchased subcategory per browsed category, as in the shipped data.
+        [json.dumps([CATALOG[categories[c]][rng.integers(0, 4)] for c in cats]) for cats in browsed],
+        _pick(rng, SEGMENTS, n).tolist(),
+        np.round(rng.uniform(500, 5000, n), 2).tolist(),
+        _pick(rng, YES_NO, n).tolist(),
+        _pick(rng, SEASONS, n).tolist(),
+    ]
+    return zip(*columns)
+
+def generate_database(db_path, n_products, n_customers=None, seed=0, chunksize=100000):
+    """Create a synthetic ecommerce.db with the db/sqlite_db.py schema and indexes."""
+    n_customers = n_products if n_customers is None else n_customers
+    rng = np.random.default_rng(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(PRODUCTS_DDL)
+    conn.execute(CUSTOMERS_DDL)
+    for table, columns, total, make_rows in (("products", PRODUCT_COLUMNS, n_products, _product_rows),
+                                             ("customers", CUSTOMER_COLUMNS, n_customers, _customer_rows)):
+        insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        for start in range(0, total, chunksize):
+            conn.executemany(insert, make_rows(rng, start, min(chunksize, total - start)))
+    create_indexes(conn)
+    conn.commit()
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+def _measure(db_path, n_customers, requests, warmup, dim, seed):
+    """Run CustomerAgent -> ProductAgent -> RecommendationAgent in a fresh process and time each request."""
+    ca = CustomerAgent(db_path)
+    pa = ProductAgent(db_path)
+    ra = RecommendationAgent(db_path, verbose=False,
+                             embedding_model=EmbeddingModel(cache=None, backend=StubBackend(dim)))
+
+    rng = np.random.default_rng(seed)
+    customer_ids = [f"C{i}" for i in rng.integers(0, n_customers, warmup + requests)]
+    latencies = []
+    candidates = 0
+    start = time.perf_counter()
+    for i, customer_id in enumerate(customer_ids):
+        if i == warmup:
+            start = time.perf_counter()
+        request_start = time.perf_counter()
+        profile = ca.get_customer_profile(customer_id)
+        products = pa.get_products(profile)
+        ra.recommend(profile, products)
+        if i >= warmup:
+            latencies.append(time.perf_counter() - request_start)
+            candidates += len(products)
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = 1000 * np.array(latencies)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": requests,
+        "mean_candidates": round(candidates / requests, 1),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def run(scales=DEFAULT_SCALES, requests=200, warmup=10, dim=256, db_dir=None, rebuild=False,
+        precompute=True, seed=0):
+    db_dir = db_dir or tempfile.mkdtemp(prefix="smart_shopping_bench_")
+    os.makedirs(db_dir, exist_ok=True)
+    results = []
+    for scale in scales:
+        db_path = os.path.join(db_dir, f"synthetic_{scale}{'_precomputed' if precompute else ''}.db")
+        result = {"rows": scale}
+        if rebuild or not os.path.exists(db_path):
+            start = time.perf_counter()
+            generate_database(db_path, scale, seed=seed)
+            if precompute:
+                build_category_embeddings(db_path, EmbeddingModel(cache=None, backend=StubBackend(dim)))
+            result["build_seconds"] = round(time.perf_counter() - start, 2)
+            print(f"Generated {db_path} in {result['build_seconds']}s")
+
+        # One process per scale so peak RSS belongs to that scale alone.
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result.update(pool.submit(_measure, db_path, scale, requests, warmup, dim, seed).result())
+        print(f"{scale:>9} rows: p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+              f"p99={result['p99_ms']:.2f}ms {result['requests_per_second']:.1f} req/s "
+              f"peak RSS={result['peak_rss_mb']}MB ({result['mean_candidates']} candidates/request)")
+        results.append(result)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline on synthetic catalogs")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="Comma-separated product/customer row counts")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per scale")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per scale")
+    parser.add_argument("--dim", type=int, default=256, help="Stub embedding dimensionality")
+    parser.add_argument("--db-dir", help="Where synthetic databases are kept (default: a new temp dir)")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate databases that already exist")
+    parser.add_argument("--no-precompute", action="store_true",
+                        help="Skip category_embeddings so products are embedded per request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run([int(scale) for scale in args.scales.split(",")], args.requests, args.warmup, args.dim,
+                  args.db_dir, args.rebuild, not args.no_precompute, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
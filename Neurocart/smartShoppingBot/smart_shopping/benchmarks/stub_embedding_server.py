@@ -0,0 +1,66 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    """Answers Ollama's POST /api/embeddings with a deterministic vector per prompt."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path != "/api/embeddings":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        prompt = payload.get("prompt", "")
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.server.dim)
+        with self.server.lock:
+            self.server.requests += 1
+
+        body = json.dumps({"embedding": vector.tolist()}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, dim=2048, latency=0.05):
+    """Start the stub server on a background thread and return (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), StubEmbeddingHandler)
+    server.daemon_threads = True
+    server.dim = dim
+    server.latency = latency
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama embedding server for benchmarks")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=2048)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(port=args.port, dim=args.dim, latency=args.latency)
+    print(f"Stub embedding server listening on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,97 @@
+import sqlite3
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+# Applied to every pooled connection; all of them are read-only, so these only tune reads.
+READ_PRAGMAS = [
+    "PRAGMA query_only = ON",
+    "PRAGMA cache_size = -32000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+]
+
+class ConnectionPool:
+    """A bounded pool of read-only SQLite connections shared across threads."""
+
+    def __init__(self, db_path, max_connections=8):
+        self.db_path = os.path.abspath(db_path)
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"Database file not found at: {self.db_path}")
+        self.max_connections = max_connections
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # PRAGMA data_version is per connection, so change detection uses one dedicated connection.
+        self._version_conn = self._connect()
+        self._version_lock = threading.Lock()
+
+    def _connect(self):
+        uri = f"file:{self.db_path}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_connections:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def data_version(self):
+        """Return a value that changes whenever another connection commits to the database."""
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._version_lock:
+            self._version_conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path, max_connections=8):
+    """Return the process-wide pool for db_path, creating it on first use.
+
+    Pools are keyed by process id as well, so a forked worker never reuses its parent's connections.
+    """
+    key = (os.getpid(), os.path.abspath(db_path))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(key[1], max_connections)
+            _pools[key] = pool
+        return pool
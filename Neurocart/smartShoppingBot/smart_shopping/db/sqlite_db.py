@@ -1,7 +1,14 @@
 import sqlite3
 import json
 import pandas as pd
+import numpy as np
+import argparse
 import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'ecommerce.db')
 
 def clean_list_field(value):
     """Convert a string like "['Books', 'Fashion']" or 'Books,Fashion' to a clean JSON list."""
@@ -12,7 +19,87 @@ def clean_list_field(value):
     items = [item.strip() for item in value.split(",") if item.strip()]
     return json.dumps(items)
 
-def create_database(products_file="products.csv", customers_file="customers.csv"):
+def clean_list_column(series):
+    """Vectorized clean_list_field for a whole column of list-like strings.
+
+    Values containing control or non-ASCII characters go through clean_list_field itself,
+    so they are stripped and escaped exactly as str.strip and json.dumps would.
+    """
+    text = series.astype("string").fillna("")
+    text = text.str.replace(r"[\"'\[\]]", "", regex=True)
+    # Collapse separators and empty items, then escape the one character json.dumps escapes in printable ASCII.
+    text = text.str.replace(r" *,[ ,]*", ",", regex=True).str.replace(r"^[ ,]+|[ ,]+$", "", regex=True)
+    text = text.str.replace("\\", "\\\\", regex=False)
+    cleaned = ('["' + text.str.replace(",", '", "', regex=False) + '"]').where(text != "", "[]")
+    values = cleaned.to_numpy(dtype=object)
+    special = text.str.contains(r"[^\x20-\x7e]", regex=True).to_numpy(dtype=bool)
+    if special.any():
+        values[special] = [clean_list_field(value) for value in series.to_numpy(dtype=object)[special]]
+    return pd.Series(values, index=series.index, dtype=object)
+
+PRODUCT_COLUMNS = ["Product_ID", "Category", "Subcategory", "Price", "Brand", "Average_Rating_of_Similar_Products",
+                   "Product_Rating", "Customer_Review_Sentiment_Score", "Holiday", "Season", "Geographical_Location",
+                   "Similar_Product_List", "Probability_of_Recommendation"]
+CUSTOMER_COLUMNS = ["Customer_ID", "Age", "Gender", "Location", "Browsing_History", "Purchase_History",
+                    "Customer_Segment", "Avg_Order_Value", "Holiday", "Season"]
+LIST_COLUMNS = {
+    "products": ["Similar_Product_List"],
+    "customers": ["Browsing_History", "Purchase_History"],
+}
+
+PRODUCTS_DDL = '''CREATE TABLE IF NOT EXISTS products (
+        Product_ID TEXT PRIMARY KEY, Category TEXT, Subcategory TEXT, Price REAL, Brand TEXT,
+        Average_Rating_of_Similar_Products REAL, Product_Rating REAL, Customer_Review_Sentiment_Score REAL,
+        Holiday TEXT, Season TEXT, Geographical_Location TEXT, Similar_Product_List TEXT,
+        Probability_of_Recommendation REAL)'''
+
+CUSTOMERS_DDL = '''CREATE TABLE IF NOT EXISTS customers (
+        Customer_ID TEXT PRIMARY KEY, Age INTEGER, Gender TEXT, Location TEXT,
+        Browsing_History TEXT, Purchase_History TEXT, Customer_Segment TEXT,
+        Avg_Order_Value REAL, Holiday TEXT, Season TEXT)'''
+
+# Secondary indexes used by the agents' queries; ProductAgent filters on Category IN (...) AND Price <= ?.
+INDEXES = {
+    "idx_products_category_price": "CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (Category, Price)",
+}
+
+def create_indexes(conn):
+    for statement in INDEXES.values():
+        conn.execute(statement)
+
+def missing_indexes(conn):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    return [name for name in INDEXES if name not in existing]
+
+def migrate(db_path=DEFAULT_DB_PATH):
+    """Add indexes introduced after a database was built, without reloading the CSVs."""
+    conn = sqlite3.connect(db_path)
+    missing = missing_indexes(conn)
+    create_indexes(conn)
+    conn.commit()
+    conn.close()
+    print(f"Created {len(missing)} missing index(es) in {db_path}." if missing else f"{db_path} is up to date.")
+    return missing
+
+def drop_indexes(conn):
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+def load_csv(conn, path, table, columns, chunksize):
+    """Stream a CSV into `table` chunk by chunk with executemany; returns the row count."""
+    insert = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+              f"VALUES ({', '.join('?' * len(columns))})")
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        for column in LIST_COLUMNS[table]:
+            chunk[column] = clean_list_column(chunk[column])
+        chunk = chunk[columns].astype(object).where(chunk[columns].notna(), None)
+        conn.executemany(insert, chunk.itertuples(index=False, name=None))
+        rows += len(chunk)
+    return rows
+
+def create_database(products_file="products.csv", customers_file="customers.csv", db_path=DEFAULT_DB_PATH,
+                    chunksize=50000):
     base_dir = os.path.dirname(__file__)
     products_path = os.path.join(base_dir, products_file)
     customers_path = os.path.join(base_dir, customers_file)
@@ -22,52 +109,99 @@ def create_database(products_file="products.csv", customers_file="customers.csv"
     if not os.path.exists(customers_path):
         raise FileNotFoundError(f"Customers file not found at: {customers_path}")
 
-    products_df = pd.read_csv(products_path)
-    customers_df = pd.read_csv(customers_path)
+    conn = sqlite3.connect(os.path.abspath(db_path))
+    # Bulk-load settings: no fsync and a WAL journal while the single load transaction runs.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(PRODUCTS_DDL)
+    conn.execute(CUSTOMERS_DDL)
+    # Indexes are rebuilt once after the load instead of being maintained row by row.
+    drop_indexes(conn)
 
-    # Clean and convert list fields to proper JSON
-    products_df["Similar_Product_List"] = products_df["Similar_Product_List"].apply(clean_list_field)
-    customers_df["Browsing_History"] = customers_df["Browsing_History"].apply(clean_list_field)
-    customers_df["Purchase_History"] = customers_df["Purchase_History"].apply(clean_list_field)
+    stats = {}
+    try:
+        for table, path, columns in (("products", products_path, PRODUCT_COLUMNS),
+                                     ("customers", customers_path, CUSTOMER_COLUMNS)):
+            start = time.perf_counter()
+            rows = load_csv(conn, path, table, columns, chunksize)
+            elapsed = time.perf_counter() - start
+            stats[table] = {"rows": rows, "seconds": round(elapsed, 3),
+                            "rows_per_second": round(rows / elapsed) if elapsed else rows}
+            print(f"Loaded {rows} {table} in {elapsed:.2f}s ({stats[table]['rows_per_second']} rows/sec)")
+
+        start = time.perf_counter()
+        create_indexes(conn)
+        conn.commit()
+        print(f"Built indexes in {time.perf_counter() - start:.2f}s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Back to a self-contained rollback journal so read-only (mode=ro) readers need no -shm file.
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+    print("Database created and populated from CSV files!")
+    return stats
 
-    products_data = products_df.to_dict(orient='records')
-    customers_data = customers_df.to_dict(orient='records')
+def build_category_embeddings(db_path=DEFAULT_DB_PATH, embedding_model=None):
+    """Embed each distinct (Category, Subcategory) pair once and link products to the vectors.
 
-    conn = sqlite3.connect("ecommerce.db")
+    Vectors are stored as float32 blobs in category_embeddings, and products.Embedding_ID
+    points at the row for the product's pair, so recommendations can score products
+    without calling the model server.
+    """
+    if embedding_model is None:
+        from models.embedding_model import EmbeddingModel
+        embedding_model = EmbeddingModel()
+
+    conn = sqlite3.connect(os.path.abspath(db_path))
     cursor = conn.cursor()
+    pairs = cursor.execute("SELECT DISTINCT Category, Subcategory FROM products "
+                           "WHERE Category IS NOT NULL AND Subcategory IS NOT NULL "
+                           "ORDER BY Category, Subcategory").fetchall()
+    matrix = embedding_model.embed_many(f"{category} {subcategory}" for category, subcategory in pairs)
 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS products (
-        Product_ID TEXT PRIMARY KEY, Category TEXT, Subcategory TEXT, Price REAL, Brand TEXT,
-        Average_Rating_of_Similar_Products REAL, Product_Rating REAL, Customer_Review_Sentiment_Score REAL,
-        Holiday TEXT, Season TEXT, Geographical_Location TEXT, Similar_Product_List TEXT,
-        Probability_of_Recommendation REAL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS category_embeddings (
+        Embedding_ID INTEGER PRIMARY KEY, Category TEXT NOT NULL, Subcategory TEXT NOT NULL,
+        Model TEXT NOT NULL, Dim INTEGER NOT NULL, Vector BLOB NOT NULL,
+        UNIQUE (Category, Subcategory))''')
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(products)")]
+    if "Embedding_ID" not in columns:
+        cursor.execute("ALTER TABLE products ADD COLUMN Embedding_ID INTEGER")
 
-    cursor.execute('''CREATE TABLE IF NOT EXISTS customers (
-        Customer_ID TEXT PRIMARY KEY, Age INTEGER, Gender TEXT, Location TEXT,
-        Browsing_History TEXT, Purchase_History TEXT, Customer_Segment TEXT,
-        Avg_Order_Value REAL, Holiday TEXT, Season TEXT)''')
-
-    for product in products_data:
-        cursor.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                       (product["Product_ID"], product["Category"], product["Subcategory"], product["Price"],
-                        product["Brand"], product["Average_Rating_of_Similar_Products"], product["Product_Rating"],
-                        product["Customer_Review_Sentiment_Score"], product["Holiday"], product["Season"],
-                        product["Geographical_Location"], product["Similar_Product_List"],
-                        product["Probability_of_Recommendation"]))
-
-    for customer in customers_data:
-        cursor.execute('INSERT OR REPLACE INTO customers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                       (customer["Customer_ID"], customer["Age"], customer["Gender"], customer["Location"],
-                        customer["Browsing_History"], customer["Purchase_History"],
-                        customer["Customer_Segment"], customer["Avg_Order_Value"], customer["Holiday"],
-                        customer["Season"]))
+    cursor.execute("DELETE FROM category_embeddings")
+    cursor.executemany("INSERT INTO category_embeddings (Embedding_ID, Category, Subcategory, Model, Dim, Vector) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       [(i + 1, category, subcategory, embedding_model.model, matrix.shape[1],
+                         np.ascontiguousarray(matrix[i], dtype=np.float32).tobytes())
+                        for i, (category, subcategory) in enumerate(pairs)])
+    cursor.execute('''UPDATE products SET Embedding_ID = (
+        SELECT e.Embedding_ID FROM category_embeddings e
+        WHERE e.Category = products.Category AND e.Subcategory = products.Subcategory)''')
 
     conn.commit()
     conn.close()
-    print("Database created and populated from CSV files!")
+    print(f"Stored {len(pairs)} category embeddings for model {embedding_model.model}.")
+    return len(pairs)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build ecommerce.db from the CSV exports")
+    parser.add_argument("--products", default="products.csv", help="Products CSV, relative to db/")
+    parser.add_argument("--customers", default="customers.csv", help="Customers CSV, relative to db/")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Database to create or update")
+    parser.add_argument("--chunksize", type=int, default=50000, help="CSV rows read and inserted per batch")
+    parser.add_argument("--precompute-embeddings", action="store_true",
+                        help="Also embed each distinct Category/Subcategory pair into category_embeddings")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Only add missing indexes to an existing database instead of rebuilding it")
+    args = parser.parse_args()
     try:
-        create_database()
+        if args.migrate:
+            migrate(args.db)
+        else:
+            create_database(args.products, args.customers, args.db, args.chunksize)
+        if args.precompute_embeddings:
+            build_category_embeddings(args.db)
     except Exception as e:
         print(f"Error: {e}")
\ No newline at end of file
@@ -0,0 +1,135 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Instrumentation:
+    """Stage timers and counters for the bot pipeline, reported as JSON.
+
+    Everything is a no-op until enable() is called, so the agents can stay instrumented
+    permanently. Stages and counters are process-wide and thread-safe; batch workers
+    send their snapshot() back to the parent, which merge()s them.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.captures = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block under `name`; repeated stages accumulate."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_stage(name, 1, time.perf_counter() - start)
+
+    def _add_stage(self, name, calls, seconds, max_seconds=None):
+        with self._lock:
+            stats = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += calls
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds if max_seconds is None else max_seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def capture(self, label, cprofile=False, memory=False, top=15):
+        """Run the block under cProfile and/or tracemalloc and keep the `top` hottest entries."""
+        if not self.enabled or not (cprofile or memory):
+            yield
+            return
+        profiler = cProfile.Profile() if cprofile else None
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if memory:
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            result = {"label": label}
+            if profiler:
+                result["cprofile"] = _top_functions(profiler, top)
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                result["tracemalloc"] = {
+                    "current_bytes": current,
+                    "peak_bytes": peak,
+                    "top_allocations": [
+                        {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                         "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                        for stat in diff[:top]
+                    ],
+                }
+                if started_tracing:
+                    tracemalloc.stop()
+            with self._lock:
+                self.captures.append(result)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {name: {"calls": stats["calls"],
+                                  "seconds": round(stats["seconds"], 6),
+                                  "mean_ms": round(1000 * stats["seconds"] / stats["calls"], 3),
+                                  "max_ms": round(1000 * stats["max_seconds"], 3)}
+                           for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "captures": list(self.captures),
+            }
+
+    def merge(self, snapshot):
+        """Fold in a snapshot taken in another process."""
+        for name, stats in snapshot["stages"].items():
+            self._add_stage(name, stats["calls"], stats["seconds"], stats["max_ms"] / 1000)
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.captures.extend(snapshot["captures"])
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+def _top_functions(profiler, top):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    rows = []
+    for func in stats.fcn_list[:top]:
+        _, calls, total, cumulative, _ = stats.stats[func]
+        filename, lineno, name = func
+        rows.append({"function": f"{filename}:{lineno}({name})", "calls": calls,
+                     "total_seconds": round(total, 6), "cumulative_seconds": round(cumulative, 6)})
+    return rows
+
+# The process-wide instance the agents report to.
+instrumentation = Instrumentation()
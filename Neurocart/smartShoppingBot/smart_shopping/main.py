@@ -1,17 +1,67 @@
 import sys
 import os
-import sqlite3
+import argparse
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
 
 from agents.customer_agent import CustomerAgent
 from agents.product_agent import ProductAgent
 from agents.recommendation_agent import RecommendationAgent
+from batch import run_batch, read_customer_ids, all_customer_ids
+from instrumentation import instrumentation
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Smart shopping recommendation bot")
+    parser.add_argument("--batch", action="store_true",
+                        help="Generate recommendations for many customers instead of prompting for one")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--ids", help="File with one Customer_ID per line (batch mode)")
+    source.add_argument("--all", action="store_true", help="Process every customer in the database (batch mode)")
+    parser.add_argument("--output", default="recommendations.jsonl",
+                        help="Batch output file; .jsonl or .csv (default: recommendations.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=100, help="Customers per worker task")
+    parser.add_argument("--profile", action="store_true",
+                        help="Record stage timings and DB/embedding counters and report them as JSON")
+    parser.add_argument("--profile-output", help="Write the --profile JSON report to this file instead of stdout")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, capture a cProfile summary of the request")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="With --profile, capture peak memory and top allocations of the request")
+    args = parser.parse_args()
+    if args.batch and not (args.ids or args.all):
+        parser.error("--batch requires --ids FILE or --all")
+    if (args.cprofile or args.tracemalloc) and not args.profile:
+        parser.error("--cprofile and --tracemalloc require --profile")
+    if args.batch and (args.cprofile or args.tracemalloc):
+        parser.error("--cprofile and --tracemalloc capture a single request and cannot be used with --batch")
+    return args
+
+def write_profile(args):
+    report = instrumentation.to_json()
+    if args.profile_output:
+        with open(args.profile_output, "w") as f:
+            f.write(report + "\n")
+        print(f"Wrote profile to {args.profile_output}")
+    else:
+        print(report)
+
+def batch_main(args):
+    customer_ids = read_customer_ids(args.ids) if args.ids else all_customer_ids(CustomerAgent())
+    run_batch(customer_ids, args.output, workers=args.workers, shard_size=args.shard_size, profile=args.profile)
 
 def main():
     db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'db', 'ecommerce.db'))
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"Database file not found at: {db_path}")
 
+    args = parse_args()
+    if args.profile:
+        instrumentation.enable()
+    if args.batch:
+        batch_main(args)
+        if args.profile:
+            write_profile(args)
+        return
+
     ca = CustomerAgent()
     pa = ProductAgent()
     ra = RecommendationAgent()
@@ -19,25 +69,31 @@ def main():
     customer_id = input("Enter Customer ID (e.g., C1000): ").strip()
 
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT Customer_ID FROM customers WHERE Customer_ID = ?", (customer_id,))
-        if not cursor.fetchone():
+        with instrumentation.capture(customer_id, cprofile=args.cprofile, memory=args.tracemalloc):
+            recommend_customer(ca, pa, ra, customer_id)
+    finally:
+        if args.profile:
+            write_profile(args)
+
+def recommend_customer(ca, pa, ra, customer_id):
+    try:
+        if not ca.customer_exists(customer_id):
             print(f"Customer {customer_id} not found in the database!")
-            conn.close()
             return
-        conn.close()
 
         print(f"Processing recommendations for {customer_id}...")
-        profile = ca.get_customer_profile(customer_id)
-        products = pa.get_products(profile)
+        with instrumentation.stage("profile_load"):
+            profile = ca.get_customer_profile(customer_id)
+        with instrumentation.stage("product_fetch"):
+            products = pa.get_products(profile)
         print(f"Found {len(products)} matching products for filtering.")
         
         if not products:
             print(f"No matching products found for {customer_id}")
             return
         
-        recommendations = ra.recommend(profile, products)
+        with instrumentation.stage("recommend"):
+            recommendations = ra.recommend(profile, products)
         print(f"Generated {len(recommendations)} recommendations.")
         if recommendations:
             print(f"\nTop 3 Recommendations for {customer_id}:")
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+
+# The hashing backend lives in Neurocart/shared so the bot and the web app embed identically.
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'shared')))
+from hashing_embedding import HashingBackend
+
+class OllamaBackend:
+    """Embeddings from a model served by Ollama; one pooled HTTP client per backend."""
+
+    cacheable = True
+
+    def __init__(self, model="tinyllama", host=None):
+        import ollama
+        self.name = model
+        # host=None honours OLLAMA_HOST.
+        self.client = ollama.Client(host=host)
+
+    def embed(self, text):
+        response = self.client.embeddings(model=self.name, prompt=text)
+        return np.asarray(response["embedding"], dtype=np.float32)
+
+
+def get_backend(name=None, model="tinyllama", host=None, dim=None):
+    """Build a backend by name; defaults come from SMART_SHOPPING_EMBEDDING_BACKEND / _DIM."""
+    name = (name or os.environ.get("SMART_SHOPPING_EMBEDDING_BACKEND", "ollama")).lower()
+    if name == "ollama":
+        return OllamaBackend(model=model, host=host)
+    if name == "hashing":
+        return HashingBackend(dim=int(dim or os.environ.get("SMART_SHOPPING_EMBEDDING_DIM", 512)))
+    raise ValueError(f"Unknown embedding backend: {name}")
@@ -0,0 +1,110 @@
+import sqlite3
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'embedding_cache.db')
+
+
+class EmbeddingCache:
+    """Two-level embedding cache: an in-memory LRU in front of a SQLite file.
+
+    Entries are keyed by (model name, SHA-256 of the text) and stored as float32 blobs.
+    The disk table is capped at `max_disk_entries`; the oldest inserts are evicted first.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_entries=4096, max_disk_entries=200000):
+        self.path = os.path.abspath(path)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS embedding_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL, text_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL, vector BLOB NOT NULL, UNIQUE (model, text_hash))''')
+        self._conn.commit()
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    @staticmethod
+    def _key(model, text):
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, model, text):
+        key = self._key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            row = self._conn.execute("SELECT vector FROM embedding_cache WHERE model = ? AND text_hash = ?",
+                                     key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            vector = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+
+    def put(self, model, text, vector):
+        key = self._key(model, text)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO embedding_cache (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                (key[0], key[1], vector.shape[0], vector.tobytes()))
+            self._disk_entries += cursor.rowcount
+            if self._disk_entries > self.max_disk_entries:
+                overflow = self._disk_entries - self.max_disk_entries
+                self._conn.execute("DELETE FROM embedding_cache WHERE id IN "
+                                   "(SELECT id FROM embedding_cache ORDER BY id LIMIT ?)", (overflow,))
+                self._disk_entries -= overflow
+            self._conn.commit()
+        return vector
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+            self._disk_entries = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    cache = EmbeddingCache()
+    print("Embedding cache stats:", cache.stats())
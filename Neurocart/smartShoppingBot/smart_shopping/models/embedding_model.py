@@ -1,12 +1,84 @@
-import ollama
+import sys
+import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.embedding_cache import EmbeddingCache
+from models.embedding_backends import get_backend
+from instrumentation import instrumentation
 
 class EmbeddingModel:
-    def __init__(self, model="tinyllama"):
-        self.model = model
+    def __init__(self, model="tinyllama", cache=True, host=None, max_workers=8, backend=None):
+        # backend is a name ("ollama", "hashing") or a backend object; None reads
+        # SMART_SHOPPING_EMBEDDING_BACKEND so each deployment can pick without code changes.
+        if backend is None or isinstance(backend, str):
+            backend = get_backend(backend, model=model, host=host)
+        self.backend = backend
+        # The backend name keys the cache and category_embeddings, e.g. "tinyllama" or "hashing-crc32-512".
+        self.model = backend.name
+        self.max_workers = max_workers
+        # cache=True uses the shared on-disk cache next to ecommerce.db; pass an EmbeddingCache
+        # to use a different file, or None/False to always call the backend. Backends that are
+        # cheaper than a cache lookup (hashing) skip it.
+        if cache is True:
+            cache = EmbeddingCache() if backend.cacheable else None
+        self.cache = cache or None
+
+    def _request(self, text):
+        instrumentation.count("embedding.backend_calls")
+        return self.backend.embed(text)
 
     def embed(self, text):
-        return ollama.embeddings(model=self.model, prompt=text)["embedding"]
+        if self.cache is not None:
+            vector = self.cache.get(self.model, text)
+            if vector is not None:
+                instrumentation.count("embedding.cache_hits")
+                return vector
+        vector = self._request(text)
+        if self.cache is not None:
+            self.cache.put(self.model, text, vector)
+        return vector
+
+    def embed_many(self, texts, max_workers=None):
+        """Embed a list of texts and return a contiguous (len(texts), dim) float32 matrix.
+
+        Duplicate texts are embedded once, cached vectors are reused, and the remaining
+        texts go to the backend in one batch or, for Ollama, concurrently over its shared client.
+        """
+        texts = list(texts)
+        unique = list(dict.fromkeys(texts))
+        instrumentation.count("embedding.texts", len(texts))
+        vectors = {}
+        missing = []
+        for text in unique:
+            vector = self.cache.get(self.model, text) if self.cache is not None else None
+            if vector is None:
+                missing.append(text)
+            else:
+                vectors[text] = vector
+
+        instrumentation.count("embedding.cache_hits", len(vectors))
+        if missing and hasattr(self.backend, "embed_many"):
+            instrumentation.count("embedding.backend_calls")
+            for text, vector in zip(missing, self.backend.embed_many(missing)):
+                vectors[text] = self.cache.put(self.model, text, vector) if self.cache is not None else vector
+        elif missing:
+            # One request per text, sent concurrently over the backend's shared client.
+            workers = max(1, min(max_workers or self.max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for text, vector in zip(missing, pool.map(self._request, missing)):
+                    if self.cache is not None:
+                        vector = self.cache.put(self.model, text, vector)
+                    vectors[text] = vector
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        dim = len(vectors[texts[0]])
+        matrix = np.empty((len(texts), dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = vectors[text]
+        return matrix
 
     def cosine_similarity(self, vec1, vec2):
         vec1, vec2 = np.array(vec1), np.array(vec2)
@@ -17,4 +89,6 @@ if __name__ == "__main__":
     emb1 = em.embed("Books")
     emb2 = em.embed("Fashion")
     sim = em.cosine_similarity(emb1, emb2)
-    print(f"Similarity between 'Books' and 'Fashion': {sim}")
\ No newline at end of file
+    print(f"Similarity between 'Books' and 'Fashion': {sim}")
+    if em.cache is not None:
+        print("Cache stats:", em.cache.stats())
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+
+from agents.customer_agent import CustomerAgent
+from agents.product_agent import ProductAgent
+from agents.recommendation_agent import RecommendationAgent
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class RecommendationServer:
+    """Minimal asyncio HTTP/1.1 server that keeps the bot's agents warm between requests.
+
+    The event loop only parses requests and writes responses; profile loading, product
+    queries and embedding/scoring run on a bounded thread pool so they never block it.
+    """
+
+    def __init__(self, workers=16):
+        self.customer_agent = CustomerAgent()
+        self.product_agent = ProductAgent()
+        self.recommendation_agent = RecommendationAgent(verbose=False)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommend")
+        self.requests = 0
+
+    def recommend(self, customer_id, top_k):
+        start = time.perf_counter()
+        profile = self.customer_agent.get_customer_profile(customer_id)
+        products = self.product_agent.get_products(profile)
+        recommendations = self.recommendation_agent.recommend(profile, products, top_k=top_k) if products else []
+        return {
+            "customer_id": customer_id,
+            "candidates": len(products),
+            "recommendations": [
+                {"product_id": product["Product_ID"], "category": product["Category"],
+                 "subcategory": product["Subcategory"], "price": product["Price"], "score": score}
+                for product, score in recommendations
+            ],
+            "elapsed_ms": round(1000 * (time.perf_counter() - start), 3),
+        }
+
+    async def route(self, method, target):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+        if method != "GET":
+            return 405, {"error": "Only GET is supported"}
+        if parts == ["health"]:
+            return 200, {"status": "healthy", "requests": self.requests}
+        if len(parts) == 2 and parts[0] == "recommendations":
+            try:
+                top_k = int(parse_qs(url.query).get("top_k", ["3"])[0])
+            except ValueError:
+                return 400, {"error": "top_k must be an integer"}
+            loop = asyncio.get_running_loop()
+            try:
+                return 200, await loop.run_in_executor(self.executor, self.recommend, parts[1], max(1, top_k))
+            except ValueError as e:
+                return 404, {"error": str(e)}
+        return 404, {"error": f"No route for {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Malformed Content-Length header"}, keep_alive=False)
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+
+                self.requests += 1
+                try:
+                    status, body = await self.route(method, target)
+                except Exception as e:
+                    status, body = 500, {"error": str(e)}
+                await self.respond(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, body, keep_alive):
+        payload = json.dumps(body).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Recommendation server listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve smart_shopping recommendations over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=16, help="Threads for database and embedding work")
+    args = parser.parse_args()
+
+    server = RecommendationServer(workers=args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()